@@ -0,0 +1,60 @@
+"""Microbenchmark of the seed throughput of the explorers and their SAT backends.
+
+Every iteration asks for an unexplored seed (with at most --max-card constraints if given) and blocks it as an
+algorithm does after a check: with probability 1/2 a small random subset of the seed is blocked up (a found MSR),
+otherwise the seed is blocked down (a found MG). The benchmark reports the seeds per second of every explorer."""
+import argparse
+import random
+import time
+
+from explorer import Explorer
+from literal_explorer import LiteralExplorer
+import sat_backends
+
+
+def make_explorer(name, dimension):
+    if name == 'explorer':
+        return Explorer(dimension)
+    if name == 'totalizer':
+        explorer = Explorer(dimension)
+        explorer.use_totalizer()
+        return explorer
+    return LiteralExplorer(dimension, sat_backends.make_backend(name))
+
+
+def run(name, dimension, seeds, maxCard, rng_seed):
+    rng = random.Random(rng_seed)
+    start = time.time()
+    explorer = make_explorer(name, dimension)
+    found = 0
+    while found < seeds:
+        seed = explorer.get_unex(maxCard = maxCard)
+        if seed is None:
+            break
+        found += 1
+        if seed and rng.random() < 0.5:
+            explorer.block_up(rng.sample(seed, min(len(seed), rng.randint(1, 4))))
+        else:
+            explorer.block_down(seed)
+    return found, time.time() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Seed throughput of the explorers")
+    parser.add_argument("--dimensions", type=int, nargs='+', default=[50, 200, 500, 1000, 2000])
+    parser.add_argument("--seeds", type=int, default=200, help = "Number of seeds per run.")
+    parser.add_argument("--max-card", type=int, default=-1, help = "Upper bound on the cardinality of the seeds.")
+    parser.add_argument("--explorers", nargs='+', default=['explorer', 'totalizer', 'z3', 'glucose4', 'cadical153'],
+                        help = "explorer - Explorer, totalizer - Explorer with the totalizer, or a backend of LiteralExplorer: " + ", ".join(sat_backends.BACKENDS))
+    parser.add_argument("--rng-seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print "%-12s %10s %8s %10s %12s" % ("explorer", "dimension", "seeds", "time [s]", "seeds / s")
+    for dimension in args.dimensions:
+        for name in args.explorers:
+            try:
+                found, elapsed = run(name, dimension, args.seeds, args.max_card, args.rng_seed)
+            except ValueError as e:
+                print "%-12s %10d skipped: %s" % (name, dimension, e)
+                continue
+            print "%-12s %10d %8d %10.3f %12.1f" % (name, dimension, found, elapsed, found / elapsed if elapsed > 0 else 0)
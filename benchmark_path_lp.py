@@ -0,0 +1,121 @@
+"""Benchmark of the construction of path LPs versus the length of the path.
+
+The paths are those of the generated benchmarks (see uppaalHelpers/example_generator.py): a single path of the given
+length from l0 to l1, whose guards check and reset the clocks periodically. For every length, the benchmark reports the
+number of rows and non-zeros of the LP and the time to build it, without solving it:
+    dense  - the rows as full lists of coefficients, each of them set in the solver (the former construct_path_lp)
+    sparse - the rows of compute_constraint, only their non-zeros set in the solver (construct_path_lp)
+    PathLP, PathGraph - without and with every constraint in their relaxation sets (relaxed).
+The LP columns are skipped if OR-tools is not installed."""
+import argparse
+import time
+
+from uppaalHelpers import pyuppaal
+from uppaalHelpers import example_generator
+from uppaalHelpers import path_analysis
+from uppaalHelpers.timed_automata import TimedAutomata
+
+try:
+    from ortools.linear_solver import pywraplp
+except ImportError:
+    pywraplp = None
+
+
+def make_path(path_length, clock_count):
+    """A TA with a single generated path of the given length, and the path as a list of locations and transitions."""
+    clocks = ['x' + str(i) for i in range(clock_count + 1)]
+    lower_bounds, upper_bounds = example_generator.benchmark_generation_helper(0, clock_count, 10, 2, 1, 0)
+    template = pyuppaal.Template("TA")
+    template.locations += [pyuppaal.Location(name='l0'), pyuppaal.Location(name='l1')]
+    template.initlocation = template.locations[0]
+    final_guard = clocks[-1] + " <= " + str(10 * (path_length + 1))
+    example_generator.add_path(template, 'l0', 'l1', path_length, 2, clocks[0:-1], lower_bounds, upper_bounds,
+                               final_guard)
+    ta = TimedAutomata()
+    ta.initialize_from_template(template)
+
+    path = [(template.name, 'l0')]
+    while path[-1][1] != 'l1':
+        t = [t for t in template.transitions if t.source.name.value == path[-1][1]][0]
+        path.append((template.name, t.source.name.value, t.target.name.value, t.synchronisation.value))
+        path.append((template.name, t.target.name.value))
+    return ta, path
+
+
+def dense_constraint(delays, c, number_of_variables):
+    """The rows of the constraint c as full lists of coefficients, as computed before the rows were sparse."""
+    A_row = [[0 for _ in range(number_of_variables)]]
+    for di in delays:
+        A_row[0][di] = 1
+    B_row = [c[2]]
+    if c[1] == '>':
+        A_row[0] = [x * -1 for x in A_row[0]]
+        B_row[0] = -1 * B_row[0]
+    if c[1] == '=':
+        A_row.append([x * -1 for x in A_row[0]])
+        B_row.append(-1 * B_row[0])
+    return A_row, B_row
+
+
+def build_lp(constraints, length_of_path, dense):
+    """The path LP of is_realizable without a relaxation set, built but not solved."""
+    A = []
+    B = []
+    for _, c, delays in constraints:
+        if dense:
+            a, b = dense_constraint(delays, c, length_of_path)
+        else:
+            a, b = path_analysis.compute_constraint({c[0]: delays}, c, -1)
+        A += a
+        B += b
+    solver = pywraplp.Solver('', pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
+    x = [solver.NumVar(0, solver.infinity(), 'x[' + str(j) + ']') for j in range(length_of_path)]
+    solver.Minimize(0)
+    for i in range(len(A)):
+        constraint = solver.RowConstraint(-solver.infinity(), B[i], '')
+        if dense:
+            for j in range(length_of_path):
+                constraint.SetCoefficient(x[j], A[i][j])
+        else:
+            for j, coefficient in A[i]:
+                constraint.SetCoefficient(x[j], coefficient)
+    return solver
+
+
+def timed(f, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        result = f()
+    return result, (time.time() - start) / repeat
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Construction time of path LPs")
+    parser.add_argument("--lengths", type=int, nargs='+', default=[6, 12, 18, 24, 30])
+    parser.add_argument("--clocks", type=int, default=4, help = "Number of periodically checked clocks (even).")
+    parser.add_argument("--repeat", type=int, default=10, help = "Number of builds per measurement.")
+    args = parser.parse_args()
+
+    if pywraplp is None:
+        print "OR-tools is not installed: the dense, sparse and PathLP columns are skipped"
+    print "%8s %6s %8s %10s %12s %12s %12s %12s %12s %12s" % ("length", "rows", "nonzeros", "variables",
+        "dense [ms]", "sparse [ms]", "PathLP [ms]", "relaxed [ms]", "graph [ms]", "relaxed [ms]")
+    for length in args.lengths:
+        ta, path = make_path(length, args.clocks)
+        msr = sorted(ta.constraint_registry.keys())
+        clocks = []
+        path_analysis.compute_clocks(path, ta, clocks)
+        constraints = path_analysis.path_constraints(path, sorted(clocks), ta)
+        rows = [path_analysis.compute_constraint({c[0]: delays}, c, -1)[0] for _, c, delays in constraints]
+        rows = [row for a in rows for row in a]
+        lp_times = ["%12s" % "-"] * 4
+        if pywraplp is not None:
+            _, dense_time = timed(lambda: build_lp(constraints, len(path) / 2, True), args.repeat)
+            _, sparse_time = timed(lambda: build_lp(constraints, len(path) / 2, False), args.repeat)
+            _, empty_time = timed(lambda: path_analysis.PathLP(ta, path, []), args.repeat)
+            _, full_time = timed(lambda: path_analysis.PathLP(ta, path, msr), args.repeat)
+            lp_times = ["%12.3f" % (1000 * t) for t in [dense_time, sparse_time, empty_time, full_time]]
+        _, graph_empty_time = timed(lambda: path_analysis.PathGraph(ta, path, []), args.repeat)
+        _, graph_time = timed(lambda: path_analysis.PathGraph(ta, path, msr), args.repeat)
+        print "%8d %6d %8d %10d %s %12.3f %12.3f" % (length, len(rows), sum(len(row) for row in rows), len(path) / 2,
+            " ".join(lp_times), 1000 * graph_empty_time, 1000 * graph_time)
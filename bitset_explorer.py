@@ -0,0 +1,95 @@
+from z3 import Not, sat
+
+from explorer import Explorer
+from bitsets import to_mask, SubsetIndex, SupersetIndex
+
+
+class BitsetExplorer(Explorer):
+    """An Explorer that also keeps the block-ups and block-downs as bitsets (see bitsets.py). The membership queries,
+    i.e., is_unexplored and hence maximize, minimize, is_critical and is_conflicting, are answered by bit operations;
+    the SAT solver is used only to find new seeds (get_unex and get_unex_subset)."""
+
+    def __init__(self, dimension):
+        Explorer.__init__(self, dimension)
+        self.upIndex = SubsetIndex() # the minimal blocked-up sets, their supersets are explored
+        self.downIndex = SupersetIndex(dimension) # the maximal blocked-down sets, their subsets are explored
+        self.deferredMasks = [] # (mask, region) of the deferred seeds, see Explorer.defer
+
+    def block_up(self, N):
+        Explorer.block_up(self, N)
+        self.upIndex.add(to_mask(N))
+
+    def block_down(self, N):
+        Explorer.block_down(self, N)
+        self.downIndex.add(to_mask(N))
+
+    def defer(self, N, region = None):
+        Explorer.defer(self, N, region)
+        self.deferredMasks.append((to_mask(N), region))
+
+    def release(self, N):
+        mask = to_mask(N)
+        for i in range(len(self.deferredMasks)):
+            if self.deferredMasks[i][0] == mask:
+                self.deferredMasks.pop(i)
+                break
+        Explorer.release(self, N)
+
+    def release_deferred(self):
+        self.deferredMasks = []
+        return Explorer.release_deferred(self)
+
+    # checks if the set of the given mask is in the region of a deferred seed
+    def is_deferred_mask(self, mask):
+        for deferred, region in self.deferredMasks:
+            if mask == deferred or (region == "up" and mask & deferred == deferred) or \
+                    (region == "down" and mask & ~deferred == 0):
+                return True
+        return False
+
+    # checks if the set of the given mask (of the given cardinality) is unexplored and satisfies the cardinality bounds
+    def is_unexplored_mask(self, mask, card, skipDeferred = False, minCard = -1, maxCard = -1):
+        if card < minCard or (maxCard >= 0 and card > maxCard):
+            return False
+        if skipDeferred and self.is_deferred_mask(mask):
+            return False
+        return self.upIndex.find_subset(mask) is None and self.downIndex.find_superset(mask) is None
+
+    def is_unexplored(self, N, skipDeferred = False):
+        return self.is_unexplored_mask(to_mask(N), len(N), skipDeferred)
+
+    #gets a maximal unexplored subset of N
+    def get_unex_subset(self, N):
+        assumptions = [Not(self.vars[c]) for c in self.complement(N)] + self.deferred_assumptions()
+        if self.s.check(assumptions) != sat:
+            return None
+        return self.grow_mask(self.seed_from_model(), N)
+
+    # maximize a given unexplored subset (seed)
+    def maximize(self, seed, minCard = -1, maxCard = -1):
+        if self.optimizer is not None:
+            return Explorer.maximize(self, seed, minCard, maxCard)
+        return self.grow_mask(seed, self.complement(seed), minCard, maxCard)
+
+    # adds the candidates to the seed one by one while it stays unexplored
+    def grow_mask(self, seed, candidates, minCard = -1, maxCard = -1):
+        mask = to_mask(seed)
+        for c in candidates:
+            bit = 1 << c
+            if mask & bit: continue
+            if self.is_unexplored_mask(mask | bit, len(seed) + 1, True, minCard, maxCard):
+                mask |= bit
+                seed.append(c)
+        return seed
+
+    # minimize a given unexplored subset (seed)
+    def minimize(self, seed, minCard = -1, maxCard = -1):
+        if self.optimizer is not None:
+            return Explorer.minimize(self, seed, minCard, maxCard)
+        mask = to_mask(seed)
+        for c in reversed(seed[:]):
+            bit = 1 << c
+            if self.is_unexplored_mask(mask & ~bit, len(seed) - 1, True, minCard, maxCard):
+                mask &= ~bit
+                seed.remove(c)
+        return seed
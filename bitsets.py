@@ -0,0 +1,127 @@
+"""Sets of constraint indices encoded as python ints, i.e., the bit i is set iff the constraint i is in the set."""
+
+
+def to_mask(N):
+    mask = 0
+    for c in N:
+        mask |= 1 << c
+    return mask
+
+
+def from_mask(mask):
+    N = []
+    while mask:
+        low = mask & -mask
+        N.append(low.bit_length() - 1)
+        mask ^= low
+    return N
+
+
+def lowest(mask):
+    """The smallest element of a non-empty set."""
+    return (mask & -mask).bit_length() - 1
+
+
+class SubsetIndex:
+    """An antichain of sets, each with a payload, that answers whether some stored set is a subset of a given set.
+    Only the minimal sets are kept: adding a set discards the stored supersets and a set that has a stored subset is
+    not added at all. Every stored set gets an id, and the index keeps, for every element, the bitset of the ids of the
+    stored sets with the element; a lookup then combines these bitsets (one per element) instead of visiting the
+    stored sets one by one."""
+
+    def __init__(self):
+        self.sets = []  # id : set, None if removed
+        self.payloads = []  # id : payload
+        self.ids = dict()  # set : id
+        self.alive = 0  # the ids of the stored sets
+        self.containing = dict()  # element : ids of the (stored or removed) sets with the element
+
+    def __len__(self):
+        return len(self.ids)
+
+    def find_subset(self, mask):
+        """Returns a pair (stored set, payload) such that the stored set is a subset of mask, or None."""
+        candidates = self.alive
+        for e, ids in self.containing.iteritems():
+            if not (mask >> e) & 1:
+                candidates &= ~ids
+                if not candidates:
+                    return None
+        if not candidates:
+            return None
+        i = lowest(candidates)
+        return self.sets[i], self.payloads[i]
+
+    def find_supersets(self, mask):
+        """Returns the stored supersets of mask."""
+        candidates = self.alive
+        for e in from_mask(mask):
+            candidates &= self.containing.get(e, 0)
+            if not candidates:
+                return []
+        return [self.sets[i] for i in from_mask(candidates)]
+
+    def add(self, mask, payload = None):
+        """Adds the set unless it has a stored subset; returns True iff the set was added."""
+        if self.find_subset(mask) is not None:
+            return False
+        for S in self.find_supersets(mask):
+            self.remove(S)
+        if len(self.sets) > 2 * len(self.ids) + 64:
+            self.compact()
+        i = len(self.sets)
+        self.sets.append(mask)
+        self.payloads.append(payload)
+        self.ids[mask] = i
+        self.alive |= 1 << i
+        for e in from_mask(mask):
+            self.containing[e] = self.containing.get(e, 0) | (1 << i)
+        return True
+
+    def remove(self, mask):
+        i = self.ids.pop(mask)
+        self.alive &= ~(1 << i)
+        self.sets[i] = None
+        self.payloads[i] = None
+
+    def compact(self):
+        """Renumbers the stored sets, dropping the ids of the removed ones."""
+        items = self.items()
+        self.__init__()
+        for S, payload in items:
+            i = len(self.sets)
+            self.sets.append(S)
+            self.payloads.append(payload)
+            self.ids[S] = i
+            self.alive |= 1 << i
+            for e in from_mask(S):
+                self.containing[e] = self.containing.get(e, 0) | (1 << i)
+
+    def items(self):
+        return [(self.sets[i], self.payloads[i]) for i in from_mask(self.alive)]
+
+
+class SupersetIndex:
+    """An antichain of maximal sets over range(dimension) that answers whether some stored set is a superset of a given
+    set. The complements of the sets are stored in a SubsetIndex."""
+
+    def __init__(self, dimension):
+        self.full = (1 << dimension) - 1
+        self.complements = SubsetIndex()
+
+    def __len__(self):
+        return len(self.complements)
+
+    def find_superset(self, mask):
+        """Returns a pair (stored set, payload) such that the stored set is a superset of mask, or None."""
+        found = self.complements.find_subset(self.full & ~mask)
+        if found is None:
+            return None
+        return self.full & ~found[0], found[1]
+
+    def add(self, mask, payload = None):
+        """Adds the set unless it has a stored superset; returns True iff the set was added."""
+        return self.complements.add(self.full & ~mask, payload)
+
+    def items(self):
+        return [(self.full & ~S, payload) for S, payload in self.complements.items()]
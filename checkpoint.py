@@ -0,0 +1,40 @@
+"""Checkpoints of long enumerations: the state of Tamus (the blocks of the explorer, the found MSRs and MGs with their
+traces, the cache of reachability checks and the statistics) in a zlib-compressed pickle. The file of a run is named
+by a hash of the model, the query, the template and the task, hence --resume finds it without further arguments."""
+import cPickle as pickle
+import hashlib
+import os
+import zlib
+
+VERSION = 1
+
+
+def checkpoint_path(directory, model_file, query_file, template_name, task):
+    digest = hashlib.sha1()
+    for file_name in [model_file, query_file]:
+        with open(file_name, 'rb') as f:
+            digest.update(f.read())
+    digest.update(template_name + '\0' + task)
+    return os.path.join(directory, "tamus_%s.ckpt" % digest.hexdigest()[:16])
+
+
+def save(path, state):
+    """Writes the state atomically, i.e., the previous checkpoint stays intact if the process dies while writing."""
+    data = zlib.compress(pickle.dumps((VERSION, state), pickle.HIGHEST_PROTOCOL))
+    temporary = path + ".tmp"
+    with open(temporary, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(temporary, path)
+
+
+def load(path):
+    """Returns the state saved in the checkpoint, or None if there is no (readable) checkpoint."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        version, state = pickle.loads(zlib.decompress(f.read()))
+    if version != VERSION:
+        return None
+    return state
@@ -1,4 +1,48 @@
 from z3 import *
+from bitsets import to_mask, SubsetIndex, SupersetIndex
+
+# the unary representation of the number of true literals: outputs[k - 1] holds iff at least k of the literals hold;
+# the outputs are encoded lazily, up to the largest bound asked for, by the clauses of the explorer
+class Totalizer:
+    def __init__(self, literals, explorer):
+        self.explorer = explorer
+        self.size = len(literals)
+        if self.size == 1:
+            self.children = None
+            self.outputs = literals[:]
+        else:
+            self.children = (Totalizer(literals[:self.size // 2], explorer), Totalizer(literals[self.size // 2:], explorer))
+            self.outputs = []
+
+    # the literal that holds iff at least k of the literals hold
+    def at_least(self, k):
+        self.extend(k)
+        return self.outputs[k - 1]
+
+    def extend(self, k):
+        k = min(k, self.size)
+        if len(self.outputs) >= k:
+            return
+        left, right = self.children
+        left.extend(k)
+        right.extend(k)
+        for m in range(len(self.outputs) + 1, k + 1):
+            r = self.explorer.new_var('card')
+            self.outputs.append(r)
+            # a_i & b_j -> r_m for i + j = m, where a_0 = b_0 = True
+            for i in range(max(0, m - right.size), min(m, left.size) + 1):
+                j = m - i
+                clause = [r]
+                if i > 0: clause.append(Not(left.outputs[i - 1]))
+                if j > 0: clause.append(Not(right.outputs[j - 1]))
+                self.explorer.add_clause(Or(clause))
+            # !a_{i+1} & !b_{j+1} -> !r_m for i + j + 1 = m, where a_{p+1} = b_{q+1} = False
+            for i in range(max(0, m - 1 - right.size), min(m - 1, left.size) + 1):
+                j = m - 1 - i
+                clause = [Not(r)]
+                if i < left.size: clause.append(left.outputs[i])
+                if j < right.size: clause.append(right.outputs[j])
+                self.explorer.add_clause(Or(clause))
 
 class Explorer:
     def __init__(self, dimension):
@@ -9,47 +53,129 @@ class Explorer:
         self.s = Solver()
         self.blockUps = []
         self.blockDowns = []
-        self.shadowBlockUps = []
-        self.shadowBlockDowns = []
+        self.shadowBlockUps = SubsetIndex() # the minimal shadow-blocked-up sets, with their traces
+        self.shadowBlockDowns = SupersetIndex(dimension) # the maximal shadow-blocked-down sets
+        self.deferred = [] # (activation literal, seed, region) of the seeds that are skipped for now, see defer
+        self.deferrals = 0
+        self.optimizer = None # if set, maximize and minimize make a single MaxSAT call, see use_optimizer
+        self.totalizer = None # encodes the bounds on the cardinality of seeds if set, see use_totalizer
+        self.auxVars = 0
+
+    # maximize and minimize then get a maximum (minimum) unexplored superset (subset) of the seed by a single call of
+    # z3's Optimize, which mirrors the constraints of the solver, instead of one SAT call per constraint
+    def use_optimizer(self):
+        self.optimizer = Optimize()
+        for clause in self.s.assertions():
+            self.optimizer.add(clause)
+
+    # encodes the cardinality of the seeds by a totalizer; the bounds of get_unex, maximize and minimize are then
+    # assumptions on its outputs instead of pseudo-Boolean constraints added and removed by push/pop, hence the solver
+    # keeps its learned clauses across the calls
+    def use_totalizer(self):
+        self.totalizer = Totalizer(self.vars, self)
+
+    def new_var(self, prefix):
+        self.auxVars += 1
+        return Bool(prefix + str(self.auxVars))
+
+    # the assumptions that bound the number of true variables, or None if the bounds cannot be satisfied
+    def card_assumptions(self, minCard = -1, maxCard = -1):
+        assumptions = []
+        if minCard > self.dimension or (maxCard >= 0 and maxCard < minCard):
+            return None
+        if minCard > 0:
+            assumptions.append(self.totalizer.at_least(minCard))
+        if 0 <= maxCard < self.dimension:
+            assumptions.append(Not(self.totalizer.at_least(maxCard + 1)))
+        return assumptions
+
+    def satisfies_card(self, N, minCard = -1, maxCard = -1):
+        return len(N) >= minCard and (maxCard < 0 or len(N) <= maxCard)
+
+    def add_clause(self, clause):
+        self.s.add(clause)
+        if self.optimizer is not None:
+            self.optimizer.add(clause)
+
+    # a new explorer of the same kind over the same constraints
+    def fresh(self):
+        return self.__class__(self.dimension)
 
     def complement(self, N):
         return [i for i in range(self.dimension) if i not in N]
 
     def shadow_block_up(self, N, trace = None):
-        self.shadowBlockUps.append({"set": N[:], "trace": trace})
+        self.shadowBlockUps.add(to_mask(N), trace)
 
     def shadow_block_down(self, N):
-        self.shadowBlockDowns.append(N[:])
+        self.shadowBlockDowns.add(to_mask(N))
+
+    # the clause that excludes the deferred region of N: N itself if region is None, its supersets if region is "up" and
+    # its subsets if region is "down"
+    def region_clause(self, N, region):
+        return Or(([Not(self.vars[n]) for n in N] if region != "down" else []) +
+                  ([self.vars[n] for n in self.complement(N)] if region != "up" else []))
+
+    # skips the seed N, or its region (see region_clause), until release_deferred is called; the seeds are still
+    # unexplored for is_unexplored(N)
+    def defer(self, N, region = None):
+        literal = Bool('defer' + str(self.deferrals))
+        self.deferrals += 1
+        self.add_clause(Implies(literal, self.region_clause(N, region)))
+        self.deferred.append((literal, N[:], region))
+
+    # returns the deferred seeds and makes them available again
+    def release_deferred(self):
+        released = self.deferred
+        for literal, _, _ in released:
+            self.add_clause(Not(literal))
+        self.deferred = []
+        return [N for _, N, _ in released]
+
+    # makes the deferred seed N available again
+    def release(self, N):
+        for i in range(len(self.deferred)):
+            if self.deferred[i][1] == N:
+                self.add_clause(Not(self.deferred.pop(i)[0]))
+                return
+
+    def deferred_assumptions(self):
+        return [literal for literal, _, _ in self.deferred]
+
+    def seed_from_model(self):
+        m = self.s.model()
+        return [i for i in range(self.dimension) if is_true(m.eval(self.vars[i], model_completion = True))]
 
     def block_up(self, N):
         self.blockUps.append(N[:])
         block = [Not(self.vars[n]) for n in N ]
-        self.s.add(Or(block))
+        self.add_clause(Or(block))
 
     def block_down(self, N):
         self.blockDowns.append(N[:])
         block = [self.vars[n] for n in self.complement(N) ]
-        self.s.add(Or(block))
+        self.add_clause(Or(block))
 
     #gets a maximal unexplored subset of N
     def get_unex_subset(self, N):
-        assumptions = [Not(self.vars[c]) for c in self.complement(N)] 
+        assumptions = [Not(self.vars[c]) for c in self.complement(N)] + self.deferred_assumptions()
         check = self.s.check(assumptions)
         if check == sat:
-            seed = []
-            m = self.s.model()
-            for x in m:
-                if is_true(m[x]):
-                    seed.append(int(str(x)[1:]))
+            seed = self.seed_from_model()
             #maximize
             for c in N:
                 if c in seed: continue
-                if self.is_unexplored(seed + [c]):
+                if self.is_unexplored(seed + [c], skipDeferred = True):
                     seed.append(c)
             return seed
         return None
     
     def get_unex(self, minCard = -1, maxCard = -1):
+        if self.totalizer is not None:
+            assumptions = self.card_assumptions(minCard, maxCard)
+            if assumptions is None or self.s.check(self.deferred_assumptions() + assumptions) != sat:
+                return None
+            return self.seed_from_model()
         if max(minCard, maxCard) >= 0:
             self.s.push()
         if minCard >= 0:
@@ -57,13 +183,9 @@ class Explorer:
         if maxCard >= 0:
             self.s.add(PbLe([(x,1) for x in self.vars], maxCard))
         
-        check = self.s.check()
+        check = self.s.check(self.deferred_assumptions())
         if check == sat:
-            seed = []
-            m = self.s.model()
-            for x in m:
-                if is_true(m[x]):
-                    seed.append(int(str(x)[1:]))
+            seed = self.seed_from_model()
             if max(minCard, maxCard) >= 0:
                 self.s.pop()
             return seed
@@ -71,8 +193,37 @@ class Explorer:
             self.s.pop()
         return None
 
+    # returns the seed that satisfies the hard literals and the most soft literals, or None if there is no such seed;
+    # the deferred seeds are considered to be explored
+    def optimize(self, hard, soft, minCard = -1, maxCard = -1):
+        o = self.optimizer
+        o.push()
+        if minCard >= 0:
+            o.add(PbGe([(x,1) for x in self.vars], minCard))
+        if maxCard >= 0:
+            o.add(PbLe([(x,1) for x in self.vars], maxCard))
+        for literal in hard + self.deferred_assumptions():
+            o.add(literal)
+        for literal in soft:
+            o.add_soft(literal)
+        seed = None
+        if o.check() == sat:
+            m = o.model()
+            seed = [i for i in range(self.dimension) if is_true(m.eval(self.vars[i], model_completion = True))]
+        o.pop()
+        return seed
+
     # maximize a given unexplored subset (seed)
     def maximize(self, seed, minCard = -1, maxCard = -1):
+        if self.optimizer is not None:
+            maximum = self.optimize([self.vars[c] for c in seed], [self.vars[c] for c in self.complement(seed)],
+                                    minCard, maxCard)
+            return maximum if maximum is not None else seed
+        if self.totalizer is not None: # the cardinality of a candidate is known, no need to constrain the solver
+            for c in self.complement(seed):
+                if self.satisfies_card(seed + [c], minCard, maxCard) and self.is_unexplored(seed + [c], skipDeferred = True):
+                    seed.append(c)
+            return seed
         if max(minCard, maxCard) >= 0:
             self.s.push()
         if minCard >= 0:
@@ -80,7 +231,7 @@ class Explorer:
         if maxCard >= 0:
             self.s.add(PbLe([(x,1) for x in self.vars], maxCard))
         for c in self.complement(seed):
-            if self.is_unexplored(seed + [c]):
+            if self.is_unexplored(seed + [c], skipDeferred = True):
                 seed.append(c)
         if max(minCard, maxCard) >= 0:
             self.s.pop()
@@ -88,6 +239,17 @@ class Explorer:
 
     # minimize a given unexplored subset (seed)
     def minimize(self, seed, minCard = -1, maxCard = -1):
+        if self.optimizer is not None:
+            minimum = self.optimize([Not(self.vars[c]) for c in self.complement(seed)],
+                                    [Not(self.vars[c]) for c in seed], minCard, maxCard)
+            return minimum if minimum is not None else seed
+        if self.totalizer is not None: # the cardinality of a candidate is known, no need to constrain the solver
+            for c in reversed(seed[:]):
+                Nc = seed[:]
+                Nc.remove(c)
+                if self.satisfies_card(Nc, minCard, maxCard) and self.is_unexplored(Nc, skipDeferred = True):
+                    seed.remove(c)
+            return seed
         if max(minCard, maxCard) >= 0:
             self.s.push()
         if minCard >= 0:
@@ -100,7 +262,7 @@ class Explorer:
             candidates = candidates[:-1]
             Nc = seed[:]
             Nc.remove(c)
-            if self.is_unexplored(Nc):
+            if self.is_unexplored(Nc, skipDeferred = True):
                 seed.remove(c)
         if max(minCard, maxCard) >= 0:
             self.s.pop()
@@ -119,28 +281,23 @@ class Explorer:
         Nc = N + [c]
         return (not self.is_unexplored(Nc)) or (not self.is_shadow_unexplored(Nc))
 
+    # returns (True, trace of a shadow-blocked-up subset of N) if there is such a subset, (False, None) otherwise
     def is_shadow_sufficient(self, N):
-        for B in self.shadowBlockUps:
-            if len(set(B["set"]) - set(N)) == 0:
-                return (True, B["trace"])
+        found = self.shadowBlockUps.find_subset(to_mask(N))
+        if found is not None:
+            return (True, found[1])
         return (False, None)
 
     def is_shadow_insufficient(self, N):
-        for B in self.shadowBlockDowns:
-            if len(set(N) - set(B)) == 0:
-                return True
-        return False
+        return self.shadowBlockDowns.find_superset(to_mask(N)) is not None
     
     def is_shadow_unexplored(self, N):
-        for B in self.shadowBlockUps:
-            if len(set(B["set"]) - set(N)) == 0:
-                return False
-        for B in self.shadowBlockDowns:
-            if len(set(N) - set(B)) == 0:
-                return False
-        return True
-
-    # checks if N is unexplored
-    def is_unexplored(self, N):
+        mask = to_mask(N)
+        return self.shadowBlockUps.find_subset(mask) is None and self.shadowBlockDowns.find_superset(mask) is None
+
+    # checks if N is unexplored; with skipDeferred, the deferred seeds are considered to be explored
+    def is_unexplored(self, N, skipDeferred = False):
         assumptions = [self.vars[c] for c in N] + [Not(self.vars[c]) for c in self.complement(N)]
+        if skipDeferred:
+            assumptions += self.deferred_assumptions()
         return (self.s.check(assumptions) == sat)
@@ -0,0 +1,113 @@
+from explorer import Explorer
+from bitsets import SubsetIndex, SupersetIndex
+from sat_backends import make_backend
+
+
+class LiteralExplorer(Explorer):
+    """An Explorer over a backend of sat_backends: the constraint i is the variable vars[i] (an integer), the clauses
+    are lists of integer literals, and the cardinality bounds are assumptions on the native cardinality encodings of
+    the backend, hence nothing is ever retracted from the solver."""
+
+    def __init__(self, dimension, backend):
+        self.dimension = dimension
+        self.backend = backend
+        self.vars = [backend.new_var() for i in range(dimension)]
+        self.blockUps = []
+        self.blockDowns = []
+        self.shadowBlockUps = SubsetIndex() # the minimal shadow-blocked-up sets, with their traces
+        self.shadowBlockDowns = SupersetIndex(dimension) # the maximal shadow-blocked-down sets
+        self.deferred = [] # (activation literal, seed, region) of the seeds that are skipped for now, see defer
+        self.optimizer = None
+        self.totalizer = None
+
+    def fresh(self):
+        return LiteralExplorer(self.dimension, make_backend(self.backend.name))
+
+    def use_optimizer(self):
+        raise ValueError("The MaxSAT seed extraction needs the z3 backend.")
+
+    def use_totalizer(self):
+        pass # the cardinality bounds are always assumptions
+
+    def add_clause(self, clause):
+        self.backend.add_clause(clause)
+
+    def defer(self, N, region = None):
+        literal = self.backend.new_var()
+        self.add_clause([-literal] + ([-self.vars[n] for n in N] if region != "down" else []) +
+                        ([self.vars[n] for n in self.complement(N)] if region != "up" else []))
+        self.deferred.append((literal, N[:], region))
+
+    def release_deferred(self):
+        released = self.deferred
+        for literal, _, _ in released:
+            self.add_clause([-literal])
+        self.deferred = []
+        return [N for _, N, _ in released]
+
+    def release(self, N):
+        for i in range(len(self.deferred)):
+            if self.deferred[i][1] == N:
+                self.add_clause([-self.deferred.pop(i)[0]])
+                return
+
+    def seed_from_model(self):
+        true = set(self.backend.true_variables(self.vars))
+        return [i for i in range(self.dimension) if self.vars[i] in true]
+
+    def block_up(self, N):
+        self.blockUps.append(N[:])
+        self.add_clause([-self.vars[n] for n in N])
+
+    def block_down(self, N):
+        self.blockDowns.append(N[:])
+        self.add_clause([self.vars[n] for n in self.complement(N)])
+
+    def card_assumptions(self, minCard = -1, maxCard = -1):
+        if minCard > self.dimension or (maxCard >= 0 and maxCard < minCard):
+            return None
+        assumptions = [self.backend.at_least(self.vars, minCard), self.backend.at_most(self.vars, maxCard)
+                       if maxCard >= 0 else None]
+        return [a for a in assumptions if a is not None]
+
+    #gets a maximal unexplored subset of N
+    def get_unex_subset(self, N):
+        assumptions = [-self.vars[c] for c in self.complement(N)] + self.deferred_assumptions()
+        if not self.backend.solve(assumptions):
+            return None
+        seed = self.seed_from_model()
+        for c in N:
+            if c in seed: continue
+            if self.is_unexplored(seed + [c], skipDeferred = True):
+                seed.append(c)
+        return seed
+
+    def get_unex(self, minCard = -1, maxCard = -1):
+        assumptions = self.card_assumptions(minCard, maxCard)
+        if assumptions is None or not self.backend.solve(assumptions + self.deferred_assumptions()):
+            return None
+        return self.seed_from_model()
+
+    # maximize a given unexplored subset (seed)
+    def maximize(self, seed, minCard = -1, maxCard = -1):
+        for c in self.complement(seed):
+            if self.satisfies_card(seed + [c], minCard, maxCard) and self.is_unexplored(seed + [c], skipDeferred = True):
+                seed.append(c)
+        return seed
+
+    # minimize a given unexplored subset (seed)
+    def minimize(self, seed, minCard = -1, maxCard = -1):
+        for c in reversed(seed[:]):
+            Nc = seed[:]
+            Nc.remove(c)
+            if self.satisfies_card(Nc, minCard, maxCard) and self.is_unexplored(Nc, skipDeferred = True):
+                seed.remove(c)
+        return seed
+
+    # checks if N is unexplored; with skipDeferred, the deferred seeds are considered to be explored
+    def is_unexplored(self, N, skipDeferred = False):
+        members = set(N)
+        assumptions = [self.vars[c] if c in members else -self.vars[c] for c in range(self.dimension)]
+        if skipDeferred:
+            assumptions += self.deferred_assumptions()
+        return self.backend.solve(assumptions)
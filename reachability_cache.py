@@ -0,0 +1,39 @@
+from bitsets import to_mask, from_mask, SubsetIndex, SupersetIndex
+
+
+class ReachabilityCache:
+    """Results of reachability checks. Sufficiency is monotone, hence a reduction is sufficient if it contains a known
+    sufficient reduction, and insufficient if it is contained in a known insufficient reduction. The cache keeps the
+    minimal known sufficient reductions (the cores, together with their traces) and the maximal known insufficient
+    reductions."""
+
+    def __init__(self, dimension):
+        self.sufficient = SubsetIndex()
+        self.insufficient = SupersetIndex(dimension)
+
+    def lookup(self, N):
+        """Returns the triple (sufficient, core, trace) for N, see Tamus.check, or None if N is not decided yet."""
+        mask = to_mask(N)
+        found = self.sufficient.find_subset(mask)
+        if found is not None:
+            core, trace = found[1]
+            return True, core[:], trace
+        if self.insufficient.find_superset(mask) is not None:
+            return False, N, []
+        return None
+
+    def insufficient_superset(self, N):
+        """Returns a maximal known insufficient reduction that contains N, or None."""
+        found = self.insufficient.find_superset(to_mask(N))
+        return from_mask(found[0]) if found is not None else None
+
+    def add(self, N, sufficient, core, trace):
+        if sufficient:
+            self.sufficient.add(to_mask(core), (core[:], trace))
+        else:
+            self.insufficient.add(to_mask(N))
+
+    def items(self):
+        """The known results as (N, sufficient, core, trace) tuples, see add."""
+        return [(core, True, core, trace) for _, (core, trace) in self.sufficient.items()] + \
+               [(from_mask(S), False, None, None) for S, _ in self.insufficient.items()]
@@ -0,0 +1,131 @@
+"""Incremental SAT solvers over integer literals (DIMACS style: the variable v is the literal v, its negation is -v).
+
+A backend answers satisfiability under assumptions and provides native cardinality constraints, which are encoded
+once and enabled by an assumption literal. Z3Backend is always available; PySATBackend wraps the CDCL solvers of
+python-sat (Glucose, CaDiCaL, MiniSat, ...) and is available only if python-sat is installed."""
+import z3
+
+try:
+    from pysat.solvers import Solver as PySATSolver
+    from pysat.card import ITotalizer
+except ImportError:
+    PySATSolver = None
+
+
+class Z3Backend:
+    name = 'z3'
+
+    def __init__(self):
+        self.solver = z3.Solver()
+        self.variables = [None]  # variable : z3 Bool
+        self.bounds = dict()  # (literals, bound, at least) : assumption literal
+        self.last_model = None
+
+    def new_var(self):
+        self.variables.append(z3.Bool('v' + str(len(self.variables))))
+        return len(self.variables) - 1
+
+    def literal(self, l):
+        return self.variables[l] if l > 0 else z3.Not(self.variables[-l])
+
+    def add_clause(self, clause):
+        self.solver.add(z3.Or([self.literal(l) for l in clause]))
+
+    def solve(self, assumptions = ()):
+        if self.solver.check([self.literal(l) for l in assumptions]) == z3.sat:
+            self.last_model = self.solver.model()
+            return True
+        return False
+
+    def true_variables(self, variables):
+        """The variables that are true in the model of the last satisfiable solve."""
+        return [v for v in variables
+                if z3.is_true(self.last_model.eval(self.variables[v], model_completion = True))]
+
+    def at_most(self, literals, k):
+        """An assumption literal that enforces that at most k of the literals hold, None if it always holds."""
+        if k >= len(literals):
+            return None
+        return self.bound(literals, k, False)
+
+    def at_least(self, literals, k):
+        """An assumption literal that enforces that at least k of the literals hold, None if it always holds."""
+        if k <= 0:
+            return None
+        return self.bound(literals, k, True)
+
+    def bound(self, literals, k, at_least):
+        key = (tuple(literals), k, at_least)
+        if key not in self.bounds:
+            activation = self.new_var()
+            terms = [(self.literal(l), 1) for l in literals]
+            self.solver.add(z3.Implies(self.literal(activation),
+                                       z3.PbGe(terms, k) if at_least else z3.PbLe(terms, k)))
+            self.bounds[key] = activation
+        return self.bounds[key]
+
+
+class PySATBackend:
+
+    def __init__(self, name = 'glucose4'):
+        if PySATSolver is None:
+            raise ValueError("The SAT backend " + name + " needs python-sat (pip install python-sat).")
+        self.name = name
+        self.solver = PySATSolver(name = name)
+        self.top = 0  # the largest variable
+        self.totalizers = dict()  # literals : ITotalizer
+        self.last_model = None
+
+    def new_var(self):
+        self.top += 1
+        return self.top
+
+    def add_clause(self, clause):
+        self.solver.add_clause(clause)
+
+    def solve(self, assumptions = ()):
+        if self.solver.solve(assumptions = list(assumptions)):
+            self.last_model = set(l for l in self.solver.get_model() if l > 0)
+            return True
+        return False
+
+    def true_variables(self, variables):
+        """The variables that are true in the model of the last satisfiable solve."""
+        return [v for v in variables if v in self.last_model]
+
+    def at_most(self, literals, k):
+        """An assumption literal that enforces that at most k of the literals hold, None if it always holds.
+        The literals get an incremental totalizer whose upper bound is increased as needed."""
+        if k >= len(literals):
+            return None
+        key = tuple(literals)
+        totalizer = self.totalizers.get(key)
+        if totalizer is None:
+            totalizer = ITotalizer(lits = list(literals), ubound = k, top_id = self.top)
+            self.totalizers[key] = totalizer
+            new_clauses = totalizer.cnf.clauses
+        elif k >= len(totalizer.rhs):
+            totalizer.increase(ubound = k, top_id = self.top)
+            new_clauses = totalizer.cnf.clauses[len(totalizer.cnf.clauses) - totalizer.nof_new:]
+        else:
+            new_clauses = []
+        for clause in new_clauses:
+            self.solver.add_clause(clause)
+        self.top = max(self.top, totalizer.top_id)
+        return -totalizer.rhs[k]
+
+    def at_least(self, literals, k):
+        """An assumption literal that enforces that at least k of the literals hold, None if it always holds;
+        i.e., at most len(literals) - k of their negations hold."""
+        if k <= 0:
+            return None
+        return self.at_most([-l for l in literals], len(literals) - k)
+
+
+BACKENDS = ['z3', 'glucose4', 'glucose3', 'cadical153', 'minisat22', 'lingeling']
+
+
+def make_backend(name):
+    if name == 'z3':
+        return Z3Backend()
+    return PySATBackend(name)
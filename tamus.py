@@ -3,12 +3,42 @@ import time
 import argparse
 import signal
 import os
+import multiprocessing
+import Queue
+import threading
+import json
+import traceback
 
 from explorer import Explorer
+from bitset_explorer import BitsetExplorer
+from literal_explorer import LiteralExplorer
+import sat_backends
+from reachability_cache import ReachabilityCache
+from bitsets import from_mask
+import checkpoint
 from uppaalHelpers import ta_helper
 from uppaalHelpers import timed_automata
 from uppaalHelpers import path_analysis
 from uppaalHelpers import xml_to_imi
+from uppaalHelpers.oracle_pool import OraclePool
+from uppaalHelpers.phase_timer import PhaseTimer
+from uppaalHelpers.model_emitter import ModelEmitter
+from uppaalHelpers.native_checker import NativeChecker
+from uppaalHelpers.master_model import MasterModel
+from uppaalHelpers.selector_model import SelectorModel, SELECTOR
+
+
+# raised in a worker of pmarco once its seed is explored by another worker
+class SeedExplored(Exception):
+    pass
+
+# goal of portfolio : the tasks whose completed run proves it
+PROVES = {
+    "mmsr": ["mmsr", "amsr", "mineba", "eba", "marco", "remus"],
+    "amsr": ["amsr", "eba", "marco", "remus"],
+    "mmg": ["mmg", "amg", "maxsba", "sba", "maxpasba", "pasba", "marco"],
+    "amg": ["amg", "sba", "pasba", "marco"],
+}
 
 
 class Tamus:
@@ -39,16 +69,44 @@ class Tamus:
 
         # Identifiers for constraints over the whole TA/
         self.clist = self.TA.constraint_keys_for_ta()
+        # instance -> template and location/transition -> constraint ids, used to parse the traces of verifyta
+        self.index = ta_helper.TraceIndex(self.model, self.TA.constraint_registry)
 
         assert len(self.clist) > 0
 
         self.dimension = len(self.clist)
         self.explorer = Explorer(self.dimension)
+        self.cache = ReachabilityCache(self.dimension) # None disables the caching of reachability checks
         self.msres = []
         self.mgs = []
         self.traces = []
         self.verbosity = 0
         self.task = "mmsr"
+        self.workers = 1 # number of concurrent reachability checks in shrink and grow
+        self.shrink_mode = "linear" # linear - one constraint per check, quickxplain - see quickxplain
+        self.grow_mode = "linear" # linear - one constraint per check, chunked - see growChunked
+        self.path_backend = "lp" # lp - GLOP, graph - negative cycle detection, see path_analysis.PathGraph
+        self.rotation = False # derive MSRs and MGs from the found ones without checks, see rotate
+        self.rotations = [] # the MSRs and MGs to be rotated
+        self.pool = None
+        self.emitter = ModelEmitter() # writes the relaxed models, by default to /dev/shm
+        self.native = None # a NativeChecker replaces verifyta if set
+        self.master = None # if set, the relaxed models are spliced from this MasterModel
+        self.selector = None # if set, a batch of checks is answered by a single verifyta run of this SelectorModel
+        self.check_timelimit = None # wall-clock seconds of a single check, None for no limit
+        self.check_memlimit = None # megabytes of memory of a single verifyta process, None for no limit
+        self.check_retries = 3 # how many times the limits of undecided checks can be doubled
+        self.budget_level = 0 # the current limits are the initial ones multiplied by 2 ** budget_level
+        self.checkpoint_file = None # if set, the state is saved to this file every checkpoint_interval seconds
+        self.checkpoint_interval = 60
+        self.last_checkpoint = time.time()
+        self.checks_log = None # if a list, the results of the performed checks are appended to it (see pmarco_worker)
+        self.strategies = ["marco", "remus", "sba", "eba", "mmsr"] # the tasks run by portfolio
+        self.portfolio_goal = "mmsr" # portfolio stops once this is proven, see PROVES
+        self.listeners = [] # functions called with every found MSR and MG, see publish
+        self.wall_start = time.time()
+        self.sync = None # if set, called before every check to receive the results of other processes (see pmarco_worker)
+        self.busy = {} # worker : the seed in progress of pmarco; the seeds are deferred, but they are not undecided
 
 
         #statistics related data-structures and functionality
@@ -65,8 +123,19 @@ class Tamus:
         self.stats["timeout"] = False
         self.stats["shrinksPaths"] = 0
         self.stats["shrinksPaths_time"] = 0
+        self.stats["shrinksPaths_solves"] = 0 # LP solves of the path analyses
+        self.stats["checks_discarded"] = 0 # speculative checks whose result was not used
+        self.stats["cache_hits"] = 0
+        self.stats["cache_misses"] = 0
+        self.stats["checks_unknown"] = 0 # checks that exceeded their limits
+        self.stats["checks_unknown_time"] = 0
+        self.stats["deferred_seeds"] = 0
+        self.stats["rotations"] = 0 # MSRs and MGs found by rotate
+        self.stats["duplicates"] = 0 # seeds of pmarco explored by another worker meanwhile
+        self.phases = PhaseTimer() # wall-clock times of the phases of the checks, see print_statistics
 
         self.timelimit = 1000000 #time limit for the MSR enumeration
+        self.stopped = False # set by iter_results when its consumer stops early, not a timeout
         self.start_time = time.clock()
     def complement(self, N):
         return [i for i in range(self.dimension) if i not in N]
@@ -74,25 +143,76 @@ class Tamus:
     def corePathAnalysis(self, N, trace):
         start_time = time.clock()
         toCheck = N[:]
+        backend = path_analysis.PathGraph if self.path_backend == "graph" else path_analysis.PathLP
+        lp = backend(self.TA, trace, [self.clist[d] for d in N]) # built once, see PathLP
         for c in toCheck:
             if self.explorer.is_critical(c, N): continue # c is minable conflicting for N
             N.remove(c)
-            if not path_analysis.is_realizable(self.TA, trace, [self.clist[d] for d in N]):
+            lp.restore(self.clist[c])
+            if not lp.is_realizable():
                 N.append(c)
+                lp.remove(self.clist[c])
+        self.stats["shrinksPaths_solves"] += lp.solves
         self.stats["shrinksPaths"] += 1
         self.stats["shrinksPaths_time"] += time.clock() - start_time
         return N
 
 
-    # returs true iff N is a sufficient reduction
-    def check(self, N, pathAnalysis = True):
+    # returs true iff N is a sufficient reduction, or None if the check exceeded the limits of the budget level
+    def check(self, N, pathAnalysis = True, level = None):
         relax_set = [self.clist[c] for c in N]
-        new_templates = self.TA.generate_relaxed_templates(relax_set)
-        # Set the TA to template in self.model, store it to file named new_model
-        new_model = ta_helper.set_templates_and_save(self.model_file, self.model, new_templates)
+        limits = self.limits(level)
+        if self.native is not None:
+            start = time.time()
+            res, used_constraints, trace = self.native.verify_reachability(relax_set, self.template_name,
+                                                                           limits[0] if limits is not None else None)
+            self.phases.since("native_search", start)
+            return self.core(N, res, used_constraints, trace, pathAnalysis)
+        # store the relaxed model to a unique file named new_model
+        new_model = self.emit_model(relax_set)
         # Now finds constraints from relaxation set that are needed for the trace
         res, used_constraints, trace = ta_helper.verify_reachability(new_model, self.query_file, self.TA,
-                                                                     relax_set, self.template_name)
+                                                                     relax_set, self.template_name,
+                                                                     index=self.index, limits=limits,
+                                                                     timer=self.phases)
+        self.emitter.release(new_model)
+        return self.core(N, res, used_constraints, trace, pathAnalysis)
+
+    # the (wall-clock seconds, megabytes) limits of a check at the budget level (the current one by default)
+    def limits(self, level = None):
+        if self.check_timelimit is None and self.check_memlimit is None:
+            return None
+        scale = 2 ** (self.budget_level if level is None else level)
+        return (self.check_timelimit * scale if self.check_timelimit is not None else None,
+                self.check_memlimit * scale if self.check_memlimit is not None else None)
+
+    # writes the model with the constraints of relax_set relaxed to a unique file; release it by self.emitter.release
+    def emit_model(self, relax_set):
+        start = time.time()
+        if self.master is not None:
+            xml_string = self.master.render(relax_set)
+            start = self.phases.since("serialization", start)
+        else:
+            new_templates = self.TA.generate_relaxed_templates(relax_set)
+            # Set the TA to template in self.model
+            ta_helper.set_templates(self.model, new_templates)
+            start = self.phases.since("relaxation", start)
+            xml_string = self.model.to_xml()
+            start = self.phases.since("serialization", start)
+        return self.emit(xml_string)
+
+    # writes a model or a query file to a unique file
+    def emit(self, content, suffix = '.xml'):
+        start = time.time()
+        path = self.emitter.emit(content, suffix)
+        self.phases.since("file_write", start)
+        return path
+
+    # turns a result of verify_reachability for N into the triple returned by check(self, N)
+    def core(self, N, res, used_constraints, trace, pathAnalysis = True):
+        if res == 0: # unknown, see decide and defer
+            return None, N, []
+        start = time.time()
         core = []
         if res == 1:
             for c in used_constraints:
@@ -102,15 +222,43 @@ class Tamus:
             if self.usePathAnalysis and pathAnalysis:
                 N = self.corePathAnalysis(N, trace)
         else: core = N
+        if self.cache is not None:
+            self.cache.add(N, res == 1, core, trace)
+        if self.checks_log is not None:
+            self.checks_log.append((N, res == 1, core, trace))
+        self.phases.since("core_analysis", start)
         return res == 1, core, trace
 
+    # answers the check of N from the cache; returns None if the result of N is not known yet
+    def lookup(self, N):
+        if self.sync is not None:
+            self.sync()
+        if self.cache is None:
+            return None
+        result = self.cache.lookup(N)
+        if result is None:
+            self.stats["cache_misses"] += 1
+        else:
+            self.stats["cache_hits"] += 1
+        return result
+
     # a wrapper for the method check(self, N)
     # returs true iff N is a sufficient reduction
     def is_sufficient(self, N, pathAnalysis = True):        
+        cached = self.lookup(N)
+        if cached is not None:
+            return cached
+        return self.timed_check(N, pathAnalysis)
+
+    # performs the check of N and collects the statistics
+    def timed_check(self, N, pathAnalysis = True, level = None):
         start_time = time.clock()
         self.stats["checks"] += 1
-        sufficient, core, trace = self.check(N, pathAnalysis)
-        if sufficient: 
+        sufficient, core, trace = self.check(N, pathAnalysis, level)
+        if sufficient is None:
+            self.stats["checks_unknown"] += 1
+            self.stats["checks_unknown_time"] += time.clock() - start_time
+        elif sufficient: 
             self.stats["checks_sufficient"] += 1
             self.stats["checks_sufficient_time"] += time.clock() - start_time
         else: 
@@ -118,85 +266,452 @@ class Tamus:
             self.stats["checks_insufficient_time"] += time.clock() - start_time
         
         return sufficient, core, trace
-   
+
+    # retries an undecided check of N with doubled limits until it is decided or the limits cannot grow anymore
+    # returns the triple of is_sufficient(self, N); sufficient is None if N stays undecided
+    def decide(self, N, pathAnalysis = True):
+        result = None, N, []
+        if self.limits() is None:
+            return result
+        for level in range(self.budget_level + 1, self.check_retries + 1):
+            result = self.timed_check(N, pathAnalysis, level)
+            if result[0] is not None:
+                break
+        return result
+
+    # skips an undecided seed, it is revisited with larger limits once the explorer runs out of seeds
+    # skips the undecided seed until the limits are raised, see next_seed; a maximal seed (that would be shrunk) is
+    # deferred with its subsets (region "down") and a minimal seed (that would be grown) with its supersets (region
+    # "up"), which are likely undecided as well
+    def defer(self, seed, region = None):
+        self.stats["deferred_seeds"] += 1
+        self.explorer.defer(seed, region)
+
+    # returns get(), the next seed of the explorer; if there is none, the deferred seeds are released
+    # and the limits of the checks are doubled
+    def next_seed(self, get):
+        self.save_checkpoint()
+        seed = get()
+        while seed is None and len(self.explorer.deferred) > 0 and self.limits() is not None \
+                and self.budget_level < self.check_retries:
+            self.budget_level += 1
+            self.explorer.release_deferred()
+            seed = get()
+        return seed
+
+    # checks all the reductions Ns concurrently, each in its own verifyta process
+    # returns the raw results of verify_reachability; use self.core to get the core of a result
+    def check_batch(self, Ns):
+        start_time = time.clock()
+        if self.native is not None: # the native checker runs in this process, hence sequentially
+            timelimit = self.limits()[0] if self.limits() is not None else None
+            results = []
+            for N in Ns:
+                native_start = time.time()
+                results.append(self.native.verify_reachability([self.clist[c] for c in N], self.template_name, timelimit))
+                self.phases.since("native_search", native_start)
+        elif self.selector is not None:
+            results = self.verify_selector_batch(Ns)
+        else:
+            results = self.verify_batch(Ns)
+        elapsed = (time.clock() - start_time) / len(Ns)
+        for res, _, _ in results:
+            self.stats["checks"] += 1
+            if res == 0:
+                self.stats["checks_unknown"] += 1
+                self.stats["checks_unknown_time"] += elapsed
+            elif res == 1:
+                self.stats["checks_sufficient"] += 1
+                self.stats["checks_sufficient_time"] += elapsed
+            else:
+                self.stats["checks_insufficient"] += 1
+                self.stats["checks_insufficient_time"] += elapsed
+        return results
+
+    # runs verifyta on all the reductions Ns in the worker pool
+    def verify_batch(self, Ns):
+        if self.pool is None:
+            self.pool = OraclePool(self.workers)
+        jobs = []
+        for i in range(len(Ns)):
+            relax_set = [self.clist[c] for c in Ns[i]]
+            jobs.append((self.emit_model(relax_set), relax_set))
+        results = self.pool.verify(jobs, self.query_file, self.TA, self.template_name, self.index, self.limits(),
+                                   self.phases)
+        for new_model, _ in jobs:
+            self.emitter.release(new_model)
+        return results
+
+    # runs verifyta once for each group of the reductions Ns that relax the same invariants, see SelectorModel
+    def verify_selector_batch(self, Ns):
+        if self.pool is None:
+            self.pool = OraclePool(self.workers)
+        relax_sets = [[self.clist[c] for c in N] for N in Ns]
+        groups = {} # invariant key : indices of Ns
+        for i in range(len(Ns)):
+            groups.setdefault(self.selector.invariant_key(relax_sets[i]), []).append(i)
+        groups = groups.values()
+        jobs = []
+        for group in groups:
+            start = time.time()
+            new_model, queries = self.selector.render_batch([relax_sets[i] for i in group])
+            self.phases.since("serialization", start)
+            jobs.append((self.emit(new_model), self.emit(queries, '.q'), [relax_sets[i] for i in group]))
+        batches = self.pool.verify_selector(jobs, self.TA, self.template_name, self.index, SELECTOR, self.limits(),
+                                            self.phases)
+        for new_model, new_queries, _ in jobs:
+            self.emitter.release(new_model)
+            self.emitter.release(new_queries)
+        results = [None] * len(Ns)
+        for group, batch in zip(groups, batches):
+            for i, result in zip(group, batch):
+                results[i] = result
+        return results
+
+    # pops from candidates the next (at most self.workers) constraints that are not skipped w.r.t. N; the native
+    # checker runs the checks of a batch one after another, hence it gets single candidates (speculation would only
+    # add the checks that are discarded)
+    def speculate(self, candidates, N, skip):
+        size = 1 if self.native is not None else self.workers
+        batch = []
+        while len(candidates) > 0 and len(batch) < size:
+            c = candidates.pop(0)
+            if skip(c, N): continue
+            batch.append(c)
+        return batch
+
+    # a generator of the results of is_sufficient(self, N) for N in Ns
+    # with more workers, the checks are run concurrently and the cores are extracted lazily,
+    # i.e., only for the results that are actually consumed; the other results are cached once the generator is closed
+    def is_sufficient_batch(self, Ns, pathAnalysis = True):
+        cached = [self.lookup(N) for N in Ns]
+        unknown = [N for i, N in enumerate(Ns) if cached[i] is None]
+        results = self.check_batch(unknown) if len(unknown) > 1 else []
+        try:
+            for i in range(len(Ns)):
+                if cached[i] is not None:
+                    yield cached[i]
+                elif len(unknown) == 1:
+                    yield self.timed_check(Ns[i], pathAnalysis)
+                else:
+                    res, used_constraints, trace = results.pop(0)
+                    yield self.core(Ns[i], res, used_constraints, trace, pathAnalysis)
+        finally:
+            # the discarded speculative checks, without the path analysis
+            for N, (res, used_constraints, trace) in zip(unknown[len(unknown) - len(results):], results):
+                self.core(N, res, used_constraints, trace, False)
+
     # takes an unexplored u-seed N and returns an unexplored MSR N' of N such that N' \subseteq N
-    def shrink(self, N, trace_for_N):
+    # the next self.workers candidates are checked speculatively; the results are committed in
+    # the original order and those that follow a change of N are discarded; the extra queries to the
+    # explorer change the next seeds, hence the MSRs and MGs are found in another order than with a
+    # single worker, but the found sets are the same
+    def shrink(self, N, trace_for_N, shadow = False):
+        if self.shrink_mode == "quickxplain":
+            return self.quickxplain(N, trace_for_N, shadow)
         start_time = time.clock()
         toCheck = N[:]
-        for c in toCheck:
-            if (c not in N) or self.explorer.is_critical(c, N): continue # c is minable conflicting for N
-            copy = N[:]
-            copy.remove(c)
-            sufficient, core, trace = self.is_sufficient(copy)
-            if sufficient:
-                N = core
-                trace_for_N = trace
+        while len(toCheck) > 0:
+            batch = self.speculate(toCheck, N, lambda c, N: (c not in N) or self.explorer.is_critical(c, N)) # c is minable conflicting for N
+            if len(batch) == 0: break
+            copies = []
+            for c in batch:
+                copy = N[:]
+                copy.remove(c)
+                copies.append(copy)
+            results = self.is_sufficient_batch(copies)
+            for i in range(len(batch)):
+                if i > 0 and self.explorer.is_critical(batch[i], N):
+                    self.stats["checks_discarded"] += len(batch) - i
+                    toCheck = batch[i + 1:] + toCheck
+                    break
+                sufficient, core, trace = next(results)
+                if sufficient is None:
+                    # an undecided constraint is kept in N, hence N stays sufficient, but it might not be minimal
+                    sufficient, core, trace = self.decide(copies[i])
+                if sufficient:
+                    N = core
+                    trace_for_N = trace
+                    self.stats["checks_discarded"] += len(batch) - i - 1
+                    toCheck = batch[i + 1:] + toCheck
+                    break
+                elif shadow and sufficient is not None:
+                    self.explorer.shadow_block_down(copies[i])
+            results.close() # caches the discarded checks
         self.stats["shrinks"] += 1
         self.stats["shrinks_time"] += (time.clock() - start_time)
         return N, trace_for_N
     
-    # takes an unexplored u-seed N and returns an unexplored MSR N' of N such that N' \subseteq N
-    def shrinkShadow(self, N, trace_for_N):
+    # takes a sufficient reduction N and returns an MSR N' \subseteq N by QuickXplain: the constraints that are critical
+    # for N are kept, and the other ones are split in halves so that a whole half is removed by a single check, hence
+    # an MSR of size k takes O(k log(|N| / k)) checks
+    def quickxplain(self, N, trace_for_N, shadow = False):
         start_time = time.clock()
-        toCheck = N[:]
-        for c in toCheck:
-            if (c not in N) or self.explorer.is_critical(c, N): continue # c is minable conflicting for N
-            copy = N[:]
-            copy.remove(c)
-            sufficient, core, trace = self.is_sufficient(copy)
+        crits = [c for c in N if self.explorer.is_critical(c, N)]
+        last = [N] # the core of the last sufficient check
+        def test(B):
+            sufficient, core, trace = self.is_sufficient(B)
+            if sufficient is None:
+                # an undecided B is considered insufficient, hence the result is sufficient, but it might not be minimal
+                sufficient, core, trace = self.decide(B)
+            elif not sufficient and shadow:
+                self.explorer.shadow_block_down(B)
             if sufficient:
-                N = core
-                trace_for_N = trace
-            else:
-                self.explorer.shadow_block_down(copy)
+                last[0] = core
+            return sufficient
+        # returns a minimal X \subseteq C such that B + X is sufficient, given that B + C is sufficient
+        def qx(B, check, C):
+            if check and test(B):
+                return []
+            if set(last[0]) <= set(B + C): # B + (C \cap core) is sufficient too
+                C = [c for c in C if c in last[0]]
+            if len(C) <= 1:
+                return C
+            C1, C2 = C[:len(C) / 2], C[len(C) / 2:]
+            X2 = qx(B + C1, True, C2)
+            X1 = qx(B + X2, len(X2) > 0, C1)
+            return X1 + X2
+        candidates = [c for c in N if c not in crits]
+        if len(candidates) > 0:
+            N = crits + qx(crits, True, candidates)
+            # the trace of N is known from the check of N or a superset with the core N (see lookup)
+            sufficient, _, trace = self.is_sufficient(N)
+            if sufficient is None:
+                sufficient, _, trace = self.decide(N)
+            trace_for_N = trace if sufficient else trace_for_N
         self.stats["shrinks"] += 1
         self.stats["shrinks_time"] += (time.clock() - start_time)
         return N, trace_for_N
 
+    # takes an unexplored u-seed N and returns an unexplored MSR N' of N such that N' \subseteq N
+    def shrinkShadow(self, N, trace_for_N):
+        return self.shrink(N, trace_for_N, shadow = True)
+
     # takes an insufficient reduction N and returns a maximal insufficient reduction N' \supseteq N
-    def grow(self, N):
+    # the candidates are checked speculatively in the same way as in shrink
+    def grow(self, N, shadow = False):
+        if self.grow_mode == "chunked":
+            return self.growChunked(N, shadow)
         start_time = time.clock()
         toCheck = self.complement(N)
-        for c in toCheck:
-            if self.explorer.is_conflicting(c, N): continue # c is minable conflicting for N
-            copy = N[:]
-            copy.append(c)
-            sufficient, core, trace = self.is_sufficient(copy)
-            if not sufficient:
-                N = copy
+        while len(toCheck) > 0:
+            batch = self.speculate(toCheck, N, self.explorer.is_conflicting) # c is minable conflicting for N
+            if len(batch) == 0: break
+            results = self.is_sufficient_batch([N + [c] for c in batch])
+            for i in range(len(batch)):
+                if i > 0 and self.explorer.is_conflicting(batch[i], N):
+                    self.stats["checks_discarded"] += len(batch) - i
+                    toCheck = batch[i + 1:] + toCheck
+                    break
+                sufficient, core, trace = next(results)
+                if sufficient is None:
+                    # an undecided constraint is not added to N, hence N stays insufficient, but it might not be maximal
+                    sufficient, core, trace = self.decide(N + [batch[i]])
+                if sufficient is False:
+                    N = N + [batch[i]]
+                    self.stats["checks_discarded"] += len(batch) - i - 1
+                    toCheck = batch[i + 1:] + toCheck
+                    break
+                elif shadow and sufficient is not None:
+                    self.explorer.shadow_block_up(core[:], trace)
+            results.close() # caches the discarded checks
         self.stats["grows"] += 1
         self.stats["grows_time"] += time.clock() - start_time
         return N
 
-    # takes an insufficient reduction N and returns a maximal insufficient reduction N' \supseteq N
-    def growShadow(self, N):
+    # takes an insufficient reduction N and returns a maximal insufficient reduction N' \supseteq N by adding chunks of
+    # the candidates at once: the chunk doubles after it is added and halves after it makes N sufficient
+    def growChunked(self, N, shadow = False):
         start_time = time.clock()
         toCheck = self.complement(N)
-        for c in toCheck:
-            if self.explorer.is_conflicting(c, N): continue # c is minable conflicting for N
-            copy = N[:]
-            copy.append(c)
-            sufficient, core, trace = self.is_sufficient(copy)
-            if not sufficient:
-                N = copy
-            else:
+        size = 1
+        while len(toCheck) > 0:
+            toCheck = [c for c in toCheck if not self.explorer.is_conflicting(c, N)]
+            if len(toCheck) == 0: break
+            chunk = toCheck[:size]
+            sufficient, core, trace = self.is_sufficient(N + chunk)
+            if sufficient is None:
+                # an undecided chunk is not added to N, hence N stays insufficient, but it might not be maximal
+                sufficient, core, trace = self.decide(N + chunk)
+            if sufficient is False:
+                N = N + chunk
+                toCheck = toCheck[size:]
+                size *= 2
+                continue
+            if sufficient and shadow:
                 self.explorer.shadow_block_up(core[:], trace)
+            needed = [c for c in chunk if c in core] if sufficient else chunk
+            if len(chunk) == 1 or len(needed) == 1: # N + the constraint contains the core, hence it is conflicting
+                toCheck.remove(needed[0] if len(needed) == 1 else chunk[0])
+            size = max(1, len(chunk) / 2)
         self.stats["grows"] += 1
         self.stats["grows_time"] += time.clock() - start_time
         return N
 
+    # takes an insufficient reduction N and returns a maximal insufficient reduction N' \supseteq N
+    def growShadow(self, N):
+        return self.grow(N, shadow = True)
+
     def markMSR(self, N, trace):
         print "Found MSR: {}".format([self.clist[c] for c in N])
+        self.publish({"type": "msr", "constraints": [self.clist[c] for c in N], "trace": trace})
         self.explorer.block_up(N)
-        if self.task not in ["amsramg", "growshrink", "shrinkgrow", "marco", "sba", "eba"]: self.explorer.block_down(N)
+        if self.task not in ["amsramg", "growshrink", "shrinkgrow", "marco", "pmarco", "portfolio", "sba", "eba"]: self.explorer.block_down(N)
         self.msres.append(N)
         self.traces.append(trace)
+        self.save_checkpoint()
+        self.rotate(N, True)
 
     def markCoMG(self, N):
         print "Found MG: {}".format([self.clist[c] for c in self.complement(N)])
-        if self.task not in ["amsramg", "growshrink", "shrinkgrow", "marco", "sba", "eba"]: self.explorer.block_up(N)
+        self.publish({"type": "mg", "constraints": [self.clist[c] for c in self.complement(N)]})
+        if self.task not in ["amsramg", "growshrink", "shrinkgrow", "marco", "pmarco", "portfolio", "sba", "eba"]: self.explorer.block_up(N)
         self.explorer.block_down(N)
         self.mgs.append(self.complement(N))
+        self.save_checkpoint()
+        self.rotate(N, False)
+
+    # whether N is known to be sufficient (True) or insufficient (False) without a check, None if it is not known
+    def known(self, N):
+        if self.cache is not None:
+            cached = self.cache.lookup(N)
+            if cached is not None:
+                return cached[0]
+        if self.explorer.is_shadow_sufficient(N)[0]:
+            return True
+        if self.explorer.is_shadow_insufficient(N):
+            return False
+        return None
+
+    # model rotation: the subsets of an MSR without one constraint are insufficient and the supersets of the complement
+    # of an MG with one more constraint are sufficient; these sets are recorded without a check. Each of them is
+    # replaced by the maximal known insufficient reduction containing it, resp. by the core of its check, and marked as
+    # a new MG, resp. MSR, if its neighbours (the sets with one constraint more, resp. less) are all known; the new MGs
+    # and MSRs are rotated in turn
+    # (a shrink or grow with undecided checks might return a non-minimal MSR or a non-maximal MG, hence rotation needs
+    # checks without limits, and an MSR is derived only if the cache has a trace for it)
+    # (a set is derived only if all its neighbours are known, which is rare, hence rotation saves few checks, see README.md)
+    def rotate(self, N, sufficient):
+        if not self.rotation or self.limits() is not None:
+            return
+        self.rotations.append((N, sufficient))
+        if len(self.rotations) > 1: return # the outer call rotates it
+        while len(self.rotations) > 0:
+            N, sufficient = self.rotations[0]
+            if sufficient:
+                self.explorer.shadow_block_up(N, self.traces[self.msres.index(N)])
+                for c in N:
+                    T = [d for d in N if d != c]
+                    self.explorer.shadow_block_down(T)
+                    if self.cache is not None:
+                        self.cache.add(T, False, None, None)
+                        T = self.cache.insufficient_superset(T)
+                    if all(self.known(T + [d]) for d in self.complement(T)) and self.explorer.is_unexplored(T):
+                        self.stats["rotations"] += 1
+                        self.markCoMG(T)
+            else:
+                self.explorer.shadow_block_down(N)
+                for c in self.complement(N):
+                    S = N + [c]
+                    self.explorer.shadow_block_up(S)
+                    cached = self.cache.lookup(S) if self.cache is not None else None
+                    if cached is None or not cached[0] or cached[2] is None:
+                        continue
+                    S = cached[1]
+                    if all(self.known([d for d in S if d != e]) is False for e in S) and self.explorer.is_unexplored(S):
+                        self.stats["rotations"] += 1
+                        self.markMSR(S, cached[2])
+            self.rotations.pop(0)
+
+    # passes the event, with the number of checks so far and the elapsed wall-clock time, to the listeners
+    def publish(self, event):
+        event["checks"] = self.stats["checks"]
+        event["time"] = time.time() - self.wall_start
+        for listener in self.listeners:
+            listener(event)
+
+    # runs the task in a background thread and yields its events as soon as they occur: {"type": "msr", "constraints",
+    # "trace", "checks", "time"}, {"type": "mg", "constraints", "checks", "time"} and, at the end, {"type": "done", ...}
+    def iter_results(self):
+        events = Queue.Queue()
+        failure = []
+        def work():
+            try:
+                self.run()
+            except Exception:
+                failure.append(sys.exc_info())
+            finally:
+                events.put(None)
+        self.listeners.append(events.put)
+        thread = threading.Thread(target = work)
+        thread.daemon = True
+        thread.start()
+        try:
+            for event in iter(events.get, None):
+                yield event
+        finally:
+            self.listeners.remove(events.put)
+            if thread.is_alive(): # the consumer stopped early; the algorithms give up at their next time check
+                self.stopped = True
+        if failure:
+            raise failure[0][0], failure[0][1], failure[0][2]
+
+    # the state of the enumeration that is saved in a checkpoint, see checkpoint.py
+    def state(self):
+        return {
+            "blockUps": self.explorer.blockUps,
+            "blockDowns": self.explorer.blockDowns,
+            "shadowBlockUps": [(from_mask(S), trace) for S, trace in self.explorer.shadowBlockUps.items()],
+            "shadowBlockDowns": [from_mask(S) for S, _ in self.explorer.shadowBlockDowns.items()],
+            # the seeds in progress are saved as unexplored
+            "deferred": [(N, region) for _, N, region in self.explorer.deferred if N not in self.busy.values()],
+            "msres": self.msres,
+            "mgs": self.mgs,
+            "traces": self.traces,
+            "cache": self.cache.items() if self.cache is not None else [],
+            "stats": self.stats,
+            "budget_level": self.budget_level,
+        }
+
+    # continues the enumeration of a saved state: the explorer gets all the blocks, hence none of the found MSRs and MGs
+    # is found again, and the cache answers all the checks performed so far
+    def restore(self, state):
+        for N in state["blockUps"]:
+            self.explorer.block_up(N)
+        for N in state["blockDowns"]:
+            self.explorer.block_down(N)
+        for N, trace in state["shadowBlockUps"]:
+            self.explorer.shadow_block_up(N, trace)
+        for N in state["shadowBlockDowns"]:
+            self.explorer.shadow_block_down(N)
+        for N, region in state["deferred"]:
+            self.explorer.defer(N, region)
+        self.msres = state["msres"]
+        self.mgs = state["mgs"]
+        self.traces = state["traces"]
+        if self.cache is not None:
+            for N, sufficient, core, trace in state["cache"]:
+                self.cache.add(N, sufficient, core, trace)
+        self.stats.update(state["stats"])
+        self.stats["timeout"] = False
+        self.budget_level = state["budget_level"]
+
+    # saves the state if checkpoint_interval seconds passed since the last checkpoint (or if forced)
+    def save_checkpoint(self, force = False):
+        if self.checkpoint_file is None:
+            return
+        if not force and time.time() - self.last_checkpoint < self.checkpoint_interval:
+            return
+        checkpoint.save(self.checkpoint_file, self.state())
+        self.last_checkpoint = time.time()
+
+    # the cardinality of the smallest found MSR, or -1 if there is none (e.g., the bound of a resumed minimumMSR)
+    def smallest_msr(self):
+        return min([len(m) for m in self.msres]) if self.msres else -1
+
+    # the cardinality of the largest complement of a found MG, or -1 if there is none
+    def largest_comg(self):
+        return max([self.dimension - len(m) for m in self.mgs]) if self.mgs else -1
 
     def run(self):
         t = self.task
@@ -208,21 +723,20 @@ class Tamus:
             pass
         elif t == "mg":
             pass
-        elif t in ["sba", "maxsba"]:
-            self.SBA(allMGs = t == "sba")
-        elif t in ["pasba", "maxpasba"]:
-            self.SBAcorePath(t == "pasba")
-        elif t in ["eba","mineba"]:
-            self.EBA(allMSRs = t == "eba")
-        elif t == "marco":
-            self.marco()
-        elif t == "remus":            
-            self.remus(subset = [i for i in range(self.dimension)], crits = [False for _ in range(self.dimension)], depth = 0)
+        elif t == "portfolio":
+            self.portfolio()
         else:
-            assert False
+            self.enumerate(t)
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        self.save_checkpoint(force = True)
+        self.publish({"type": "done", "msrs": len(self.msres), "mgs": len(self.mgs), "timeout": self.stats["timeout"]})
         print "MSRs:", len(self.msres)
         print "MGs:", len(self.mgs)
         print "checks:", self.stats["checks"]
+        if len(self.explorer.deferred) > 0:
+            print "undecided seeds (the checks exceeded their limits):", len(self.explorer.deferred)
 
         uMSR = set()
         iMSR = set(self.complement([]))
@@ -264,6 +778,27 @@ class Tamus:
         if self.args.run_imitator_on_partition:
             self.run_imitator_on_partition(partition)
 
+    # runs the enumeration algorithm of the task t
+    def enumerate(self, t):
+        if t in ["mmsr", "amsr"]:
+            self.minimumMSR(allMSRs = t == "amsr")
+        elif t in ["mmg", "amg"]:
+            self.minimumMG(allMGs = t == "amg")
+        elif t in ["sba", "maxsba"]:
+            self.SBA(allMGs = t == "sba")
+        elif t in ["pasba", "maxpasba"]:
+            self.SBAcorePath(t == "pasba")
+        elif t in ["eba","mineba"]:
+            self.EBA(allMSRs = t == "eba")
+        elif t == "marco":
+            self.marco()
+        elif t == "pmarco":
+            self.pmarco()
+        elif t == "remus":            
+            self.remus(subset = [i for i in range(self.dimension)], crits = [False for _ in range(self.dimension)], depth = 0)
+        else:
+            assert False
+
     def run_imitator_on_partition(self, partition):
         min_valuation = sys.maxint
         min_parameters = []
@@ -393,8 +928,8 @@ class Tamus:
 
     def EBA(self, allMSRs = True):
         start_time = time.clock()
-        seed = self.explorer.get_unex()
-        current_max = -1
+        current_max = -1 if allMSRs else self.smallest_msr() # a resumed run continues with its bound
+        seed = self.explorer.get_unex(maxCard = current_max)
         while seed is not None:
             seed = self.explorer.minimize(seed[:])
             sufficient, trace = None, None
@@ -403,27 +938,30 @@ class Tamus:
                 sufficient, trace = True, sTrace
             else:
                 sufficient, _, trace = self.is_sufficient(seed)
-            if sufficient:
+            if sufficient is None:
+                self.defer(seed, "up")
+            elif sufficient:
                 self.markMSR(seed[:], trace)
                 if not allMSRs:
                     current_max = len(seed)
             else:
                 coMG = self.growShadow(seed)
                 self.markCoMG(coMG)
-            seed = self.explorer.get_unex(maxCard = current_max)
+            seed = self.next_seed(lambda: self.explorer.get_unex(maxCard = current_max))
+            if self.stopped: break # see iter_results
             if time.clock() - start_time > self.timelimit:
                 self.stats["timeout"] = True
                 print("User-defined timelimit of {} seconds exceeded. Aborting MMG extraction.".format(self.timelimit))
                 break
     
     def TBA(self, N, trace, msr):        
-        exp = Explorer(self.dimension)
+        exp = self.explorer.fresh()
         exp.block_up(msr)
         seed = exp.get_unex_subset(N)
         while seed is not None:
             if self.explorer.is_shadow_insufficient(seed):
                 exp.block_down(seed)
-            elif path_analysis.is_realizable(self.TA, trace, [self.clist[d] for d in seed]):
+            elif path_analysis.is_realizable(self.TA, trace, [self.clist[d] for d in seed], self.path_backend):
                 msr, trace = self.shrinkShadow(N, trace)
                 self.markMSR(msr, trace)
             else:
@@ -433,8 +971,8 @@ class Tamus:
 
     def SBAcorePath(self, allMGs = True):
         start_time = time.clock()
-        seed = self.explorer.get_unex()
-        current_min = -1
+        current_min = -1 if allMGs else self.largest_comg()
+        seed = self.explorer.get_unex(minCard = current_min)
         while seed is not None:
             seed = self.explorer.maximize(seed[:])
             sufficient, core, trace = None, None, None
@@ -443,7 +981,9 @@ class Tamus:
                 sufficient = False
             else:
                 sufficient, core, trace = self.is_sufficient(seed, pathAnalysis = False)
-            if sufficient:
+            if sufficient is None:
+                self.defer(seed, "down")
+            elif sufficient:
                 N = self.corePathAnalysis(core, trace)
                 msr, trace = self.shrinkShadow(N, trace)
                 self.markMSR(msr, trace)
@@ -452,7 +992,8 @@ class Tamus:
                 self.markCoMG(seed)
                 if not allMGs:
                     current_min = len(seed)
-            seed = self.explorer.get_unex(minCard = current_min)
+            seed = self.next_seed(lambda: self.explorer.get_unex(minCard = current_min))
+            if self.stopped: break # see iter_results
             if time.clock() - start_time > self.timelimit:
                 self.stats["timeout"] = True
                 print("User-defined timelimit of {} seconds exceeded. Aborting MMG extraction.".format(self.timelimit))
@@ -461,8 +1002,8 @@ class Tamus:
 
     def SBA(self, allMGs = True):
         start_time = time.clock()
-        seed = self.explorer.get_unex()
-        current_min = -1
+        current_min = -1 if allMGs else self.largest_comg()
+        seed = self.explorer.get_unex(minCard = current_min)
         while seed is not None:
             seed = self.explorer.maximize(seed[:])
             sufficient, core, trace = None, None, None
@@ -471,14 +1012,17 @@ class Tamus:
                 sufficient = False
             else:
                 sufficient, core, trace = self.is_sufficient(seed)
-            if sufficient:
+            if sufficient is None:
+                self.defer(seed, "down")
+            elif sufficient:
                 msr, trace = self.shrinkShadow(core, trace)
                 self.markMSR(msr, trace)
             else:
                 self.markCoMG(seed)
                 if not allMGs:
                     current_min = len(seed)
-            seed = self.explorer.get_unex(minCard = current_min)
+            seed = self.next_seed(lambda: self.explorer.get_unex(minCard = current_min))
+            if self.stopped: break # see iter_results
             if time.clock() - start_time > self.timelimit:
                 self.stats["timeout"] = True
                 print("User-defined timelimit of {} seconds exceeded. Aborting MMG extraction.".format(self.timelimit))
@@ -500,7 +1044,9 @@ class Tamus:
         streak = 0
         while seed is not None:
             sufficient, core, trace = self.is_sufficient(seed)
-            if sufficient:
+            if sufficient is None:
+                self.defer(seed, "down")
+            elif sufficient:
                 streak = 0
                 msr, trace = self.shrink(core, trace)
                 self.markMSR(msr, trace)
@@ -517,7 +1063,11 @@ class Tamus:
                         recSubset = subset[:]
                         recSubset.remove(c)
                         self.remus(recSubset, crits, depth + 1)
-            seed = self.explorer.get_unex_subset(subset)
+            if depth == 0:
+                seed = self.next_seed(lambda: self.explorer.get_unex_subset(subset))
+            else:
+                seed = self.explorer.get_unex_subset(subset)
+            if self.stopped: break # see iter_results
             if time.clock() - start_time > self.timelimit:
                 self.stats["timeout"] = True
                 print("User-defined timelimit of {} seconds exceeded. Aborting MMG extraction.".format(self.timelimit))
@@ -529,27 +1079,266 @@ class Tamus:
         while seed is not None:
             seed = self.explorer.maximize(seed[:])
             sufficient, core, trace = self.is_sufficient(seed)
-            if not sufficient:
+            if sufficient is None:
+                self.defer(seed, "down")
+            elif not sufficient:
+                # the maximized seed might be a subset of a deferred seed, which maximize skips
+                if any(set(seed) < set(N) for _, N, _ in self.explorer.deferred):
+                    seed = self.grow(seed)
                 self.markCoMG(seed)
             else:
                 msr, trace = self.shrink(core, trace)
                 self.markMSR(msr, trace)
-            seed = self.explorer.get_unex()
+            seed = self.next_seed(self.explorer.get_unex)
+            if self.stopped: break # see iter_results
             if time.clock() - start_time > self.timelimit:
                 self.stats["timeout"] = True
                 print("User-defined timelimit of {} seconds exceeded. Aborting MMG extraction.".format(self.timelimit))
                 break
         print "checks:", self.stats["checks"]
+
+    # marco with self.workers worker processes: each of them checks a different maximal unexplored seed, and shrinks it
+    # to an MSR or grows it to an MG, on its own copy of the map; the found MSRs and MGs are blocked in the map of this
+    # process and broadcast, together with the results of the checks, to the copies of all the workers
+    def pmarco(self):
+        start_time = time.clock()
+        tasks = [multiprocessing.Queue() for _ in range(self.workers)]
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target = self.pmarco_worker, args = (i, tasks[i], results))
+                     for i in range(self.workers)]
+        for process in processes:
+            process.daemon = True
+            process.start()
+        busy = self.busy # worker : seed; the seeds in progress are deferred, hence no other worker gets them
+        while True:
+            while len(busy) < self.workers and not self.stats["timeout"] and not self.stopped:
+                seed = self.next_seed(self.explorer.get_unex) if len(busy) == 0 else self.explorer.get_unex()
+                if seed is None: break
+                seed = self.explorer.maximize(seed[:])
+                # the seed is a maximal unexplored set unless it is a subset of a deferred one
+                maximal = not any(set(seed) < set(N) for _, N, _ in self.explorer.deferred)
+                self.explorer.defer(seed)
+                worker = [i for i in range(self.workers) if i not in busy][0]
+                tasks[worker].put(("seed", (seed, maximal, self.budget_level)))
+                busy[worker] = seed
+            if len(busy) == 0: break
+            message = results.get()
+            if message[0] == "error":
+                self.fail(processes, message)
+            worker, seed, result, checks, stats, samples = message
+            del busy[worker]
+            for key in stats:
+                self.stats[key] += stats[key]
+            for phase in samples:
+                self.phases.samples[phase].extend(samples[phase])
+            updates = [("cache", check) for check in checks]
+            for check in checks:
+                if self.cache is not None:
+                    self.cache.add(*check)
+            if result is None: # the worker gave up the seed that another one explored meanwhile
+                self.explorer.release(seed)
+                self.stats["duplicates"] += 1
+            elif result[0] is None: # the seed stays deferred
+                self.stats["deferred_seeds"] += 1
+            else:
+                self.explorer.release(seed)
+                sufficient, N, trace = result
+                if not self.explorer.is_unexplored(N):
+                    self.stats["duplicates"] += 1
+                elif sufficient:
+                    self.markMSR(N, trace)
+                    updates.append(("up", N))
+                else:
+                    self.markCoMG(N)
+                    updates.append(("down", N))
+            for i in range(self.workers):
+                tasks[i].put(("updates", updates))
+            if time.clock() - start_time > self.timelimit and not self.stats["timeout"]:
+                self.stats["timeout"] = True
+                print("User-defined timelimit of {} seconds exceeded. Aborting MMG extraction.".format(self.timelimit))
+        for i in range(self.workers):
+            tasks[i].put(None)
+        for process in processes:
+            process.join()
+        print "checks:", self.stats["checks"]
+
+    # a worker process of pmarco; it got a copy of this Tamus by fork
+    def pmarco_worker(self, worker, tasks, results):
+        try:
+            self.pmarco_seeds(worker, tasks, results)
+        except Exception: # reported to pmarco, which would wait for the result forever otherwise
+            results.put(("error", worker, traceback.format_exc()))
+
+    # checks the seeds sent by pmarco until it sends None, see pmarco_worker
+    def pmarco_seeds(self, worker, tasks, results):
+        self.pool = None # the threads of the parent are not inherited
+        self.workers = 1
+        self.checkpoint_file = None
+        seeds = []
+        current = [] # the seed in progress
+        def receive(message):
+            kind, arguments = message
+            if kind == "seed":
+                seeds.append(arguments)
+                return
+            self.apply_updates(arguments)
+        def sync():
+            received = False
+            while True:
+                try:
+                    receive(tasks.get_nowait())
+                    received = True
+                except Queue.Empty:
+                    break
+            if received and current and not self.explorer.is_unexplored(current[0]):
+                raise SeedExplored()
+        self.sync = sync
+        for message in iter(tasks.get, None):
+            receive(message)
+            if len(seeds) == 0: continue
+            seed, maximal, self.budget_level = seeds.pop()
+            stats = dict((key, value) for key, value in self.stats.items() if key != "timeout")
+            self.phases = PhaseTimer()
+            self.checks_log = []
+            current[:] = [seed]
+            try:
+                sufficient, core, trace = self.is_sufficient(seed)
+                if sufficient is None:
+                    result = None, seed, []
+                elif sufficient:
+                    result = (True,) + self.shrink(core, trace)
+                else:
+                    result = False, seed if maximal else self.grow(seed), []
+            except SeedExplored:
+                result = None
+            current[:] = []
+            results.put((worker, seed, result, self.checks_log,
+                         dict((key, self.stats[key] - stats[key]) for key in stats), self.phases.samples))
+
+    # runs the strategies (tasks) concurrently, each in its own process with its own map; the found MSRs and MGs, and
+    # the results of the checks, are collected here and broadcast to the other strategies, which block them in their maps
+    # the portfolio stops once a strategy that proves the goal completes
+    def portfolio(self):
+        tasks = [multiprocessing.Queue() for _ in self.strategies]
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target = self.portfolio_strategy, args = (i, tasks[i], results))
+                     for i in range(len(self.strategies))]
+        for process in processes:
+            process.daemon = True
+            process.start()
+        running = set(range(len(self.strategies)))
+        stats = {} # strategy : its statistics so far, which are added to self.stats as they arrive
+        winner = None
+        while len(running) > 0 and winner is None and not self.stopped:
+            message = results.get()
+            if message[0] == "error":
+                self.fail(processes, message)
+            strategy, done, (msres, coMGs, checks), strategy_stats, samples = message
+            # the statistics are up to date before the MSRs and MGs are marked, see publish and state
+            for key in strategy_stats:
+                self.stats[key] += strategy_stats[key] - stats.get(strategy, {}).get(key, 0)
+            stats[strategy] = strategy_stats
+            for phase in samples:
+                self.phases.samples[phase].extend(samples[phase])
+            updates = [("cache", check) for check in checks]
+            for check in checks:
+                if self.cache is not None:
+                    self.cache.add(*check)
+            for N, trace in msres:
+                if self.explorer.is_unexplored(N):
+                    self.markMSR(N, trace)
+                    updates.append(("up", N))
+            for N in coMGs:
+                if self.explorer.is_unexplored(N):
+                    self.markCoMG(N)
+                    updates.append(("down", N))
+            if updates:
+                for i in running:
+                    if i != strategy:
+                        tasks[i].put(updates)
+            if done is not None:
+                running.discard(strategy)
+                if done and self.strategies[strategy] in PROVES[self.portfolio_goal]:
+                    winner = self.strategies[strategy]
+        for i in running:
+            tasks[i].put(None)
+        for process in processes:
+            process.join(1) # a strategy stops before its next check
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.stats["timeout"] = winner is None and not self.stopped
+        if winner is None and not self.stopped:
+            print "portfolio: no strategy proved the goal", self.portfolio_goal
+        elif winner is not None:
+            print "portfolio:", winner, "proved the goal", self.portfolio_goal
+
+    # a strategy process of portfolio; it got a copy of this Tamus by fork
+    def portfolio_strategy(self, strategy, tasks, results):
+        sys.stdout = open(os.devnull, 'w') # the MSRs and MGs are printed and published by the portfolio
+        self.listeners = []
+        self.pool = None # the threads of the parent are not inherited
+        self.checkpoint_file = None
+        self.task = self.strategies[strategy]
+        self.checks_log = []
+        initial = dict(self.stats)
+        sent = [0, 0, dict((phase, len(self.phases.samples[phase])) for phase in self.phases.samples)] # sent so far
+        def send(done = None):
+            msres = zip(self.msres[sent[0]:], self.traces[sent[0]:])
+            coMGs = [self.complement(m) for m in self.mgs[sent[1]:]]
+            samples = dict((phase, self.phases.samples[phase][sent[2][phase]:]) for phase in sent[2])
+            if done is None and not msres and not coMGs and not self.checks_log: return
+            stats = dict((key, self.stats[key] - initial[key]) for key in self.stats if key != "timeout")
+            results.put((strategy, done, (msres, coMGs, self.checks_log), stats, samples))
+            sent[0], sent[1] = len(self.msres), len(self.mgs)
+            sent[2] = dict((phase, len(self.phases.samples[phase])) for phase in sent[2])
+            self.checks_log = []
+        def sync():
+            send()
+            while True:
+                try:
+                    updates = tasks.get_nowait()
+                except Queue.Empty:
+                    break
+                if updates is None: # the portfolio is over
+                    sys.exit(0)
+                self.apply_updates(updates)
+        self.sync = sync
+        try:
+            self.enumerate(self.task)
+            send(done = not self.stats["timeout"] and len(self.explorer.deferred) == 0)
+        except Exception: # reported to portfolio, which would wait for the strategy forever otherwise
+            results.put(("error", strategy, traceback.format_exc()))
+
+    # stops the processes of pmarco or portfolio after one of them reported the failure ("error", index, traceback)
+    def fail(self, processes, message):
+        for process in processes:
+            process.terminate()
+            process.join()
+        raise RuntimeError("Process {} failed:\n{}".format(message[1], message[2]))
+
+    # blocks the results found by other processes, see pmarco and portfolio: ("up", MSR), ("down", complement of MG)
+    # and ("cache", result of a check)
+    def apply_updates(self, updates):
+        for update, N in updates:
+            if update == "up":
+                self.explorer.block_up(N)
+            elif update == "down":
+                self.explorer.block_down(N)
+            elif self.cache is not None:
+                self.cache.add(*N)
     
     #finds a minimum minimal guarantee
     def minimumMG(self, allMGs = False):
         start_time = time.clock()
-        seed = self.explorer.get_unex()
-        current_max = -1
+        current_max = -1 if allMGs else self.largest_comg()
+        seed = self.explorer.get_unex(minCard = current_max + 1)
         while seed is not None:
             seed = self.explorer.minimize(seed[:], minCard = current_max + 1)
             sufficient, core, trace = self.is_sufficient(seed)
-            if not sufficient:
+            if sufficient is None:
+                self.defer(seed, "up")
+            elif not sufficient:
                 coMG = self.grow(seed)
                 self.markCoMG(coMG)
                 if not allMGs:
@@ -558,7 +1347,8 @@ class Tamus:
             else:
                 seed,_ = self.shrink(seed, None)
                 self.explorer.block_up(seed)
-            seed = self.explorer.get_unex(minCard = current_max + 1)
+            seed = self.next_seed(lambda: self.explorer.get_unex(minCard = current_max + 1))
+            if self.stopped: break # see iter_results
             if time.clock() - start_time > self.timelimit:
                 self.stats["timeout"] = True
                 print("User-defined timelimit of {} seconds exceeded. Aborting MMG extraction.".format(self.timelimit))
@@ -629,12 +1419,14 @@ class Tamus:
     #finds a minimum minimal sufficient reduction
     def minimumMSR(self, allMSRs = False):
         start_time = time.clock()
-        seed = self.explorer.get_unex()
-        current_min = -1
+        current_min = -1 if allMSRs else self.smallest_msr()
+        seed = self.explorer.get_unex(maxCard = current_min - 1)
         while seed is not None:
             seed = self.explorer.maximize(seed[:], maxCard = current_min - 1)
             sufficient, core, trace = self.is_sufficient(seed)
-            if sufficient:
+            if sufficient is None:
+                self.defer(seed, "down")
+            elif sufficient:
                 msr, trace = self.shrink(core, trace)
                 self.markMSR(msr, trace)
                 if not allMSRs:
@@ -643,7 +1435,8 @@ class Tamus:
             else:
                 seed = self.grow(seed)
                 self.explorer.block_down(seed)
-            seed = self.explorer.get_unex(maxCard = current_min - 1)
+            seed = self.next_seed(lambda: self.explorer.get_unex(maxCard = current_min - 1))
+            if self.stopped: break # see iter_results
             if time.clock() - start_time > self.timelimit:
                 self.stats["timeout"] = True
                 print("User-defined timelimit of {} seconds exceeded. Aborting MMSR extraction.".format(self.timelimit))
@@ -675,19 +1468,39 @@ class Tamus:
         print "Performed reachability checks:", self.stats["checks"]
         print "Checks with result 'reachable':", self.stats["checks_sufficient"] 
         print "Checks with result 'unreachable':", self.stats["checks_insufficient"] 
-        print "Total time spent by reachability checks:", self.stats["checks_insufficient_time"] + self.stats["checks_sufficient_time"]
+        print "Checks answered by the cache:", self.stats["cache_hits"]
+        print "Checks missed by the cache:", self.stats["cache_misses"]
+        if self.native is not None and self.native.incremental:
+            print "Checks that resumed a previous exploration:", self.native.resumed
+        print "Checks with result 'unknown' (limits exceeded):", self.stats["checks_unknown"]
+        print "Deferred seeds:", self.stats["deferred_seeds"]
+        if self.rotation:
+            print "MSRs and MGs found by rotation:", self.stats["rotations"]
+        if self.task == "pmarco":
+            print "Seeds given up or MSRs and MGs found again by the workers:", self.stats["duplicates"]
+        print "Total time spent by reachability checks:", self.stats["checks_insufficient_time"] + self.stats["checks_sufficient_time"] + self.stats["checks_unknown_time"]
         print "Average time of 'reachable' check:", self.stats["checks_sufficient_time"]/ self.stats["checks_sufficient"]
         print "Average time of 'unreachable' check:", self.stats["checks_insufficient_time"]/ self.stats["checks_insufficient"]
         print "Shrinks:", self.stats["shrinks"]  
         print "Total time spent by shrinks:", self.stats["shrinks_time"]  
         print "Path analyses:", self.stats["shrinksPaths"]  
         print "Total time spent by path analyses:", self.stats["shrinksPaths_time"]  
+        print "LP solves of path analyses:", self.stats["shrinksPaths_solves"]
         print "Grows:", self.stats["grows"]
         print "Total time spent by grows:", self.stats["grows_time"]
+        print "Wall-clock times of the phases of the checks (in seconds; child_cpu is the CPU time of verifyta):"
+        self.phases.print_summary()
 
         print "==========================="
         print ""
 
+    # writes the statistics and the times of the phases of the checks as a JSON object
+    def dump_statistics(self, path):
+        stats = dict(self.stats)
+        stats["msrs"] = len(self.msres)
+        stats["mgs"] = len(self.mgs)
+        self.phases.dump_json(path, stats)
+
 if __name__ == '__main__':
     
     #define command line arguments
@@ -697,13 +1510,38 @@ if __name__ == '__main__':
     parser.add_argument("template_name", help="Name of template")
     parser.add_argument("--verbose", "-v", action="count", help = "Use the flag to increase the verbosity of the outputs. The flag can be used repeatedly.")    
     parser.add_argument("--msr-timelimit", type=int, help = "Sets up timelimit for MSR enumeration. Note that the computation is not terminated exactly after the timelimit, but once the last identified MSR exceeds the timelimit. We recommend you to use UNIX timeout when using our tool, if you want to timeout the whole computation. ")
-    parser.add_argument("--task", choices=["pasba", "maxpasba", "msr", "mmsr", "mg", "mmg", "amsr", "amg", "amsramg", "eba", "sba", "marco", "remus", "maxsba", "mineba"], help = "Choose the computation taks: msr - an MSR, mmsr - a minimum MSR, mg - an MG, mmg - a minimum MG, amsr - all MSRs, amg - all MGs, amsramg - all MSRs and MGs.", default = "mmsr")
+    parser.add_argument("--task", choices=["pasba", "maxpasba", "msr", "mmsr", "mg", "mmg", "amsr", "amg", "amsramg", "eba", "sba", "marco", "pmarco", "portfolio", "remus", "maxsba", "mineba"], help = "Choose the computation taks: msr - an MSR, mmsr - a minimum MSR, mg - an MG, mmg - a minimum MG, amsr - all MSRs, amg - all MGs, amsramg - all MSRs and MGs, pmarco - all MSRs and MGs by marco with --workers worker processes, portfolio - the --portfolio-goal by the --portfolio tasks run concurrently.", default = "mmsr")
+    parser.add_argument("--portfolio", nargs='+', choices=["mmsr", "amsr", "mmg", "amg", "eba", "mineba", "sba", "maxsba", "pasba", "maxpasba", "marco", "remus"], default=["marco", "remus", "sba", "eba", "mmsr"], help = "The tasks that --task portfolio runs concurrently, each in its own process; they share the found MSRs and MGs and the results of the checks.")
+    parser.add_argument("--portfolio-goal", choices=["mmsr", "amsr", "mmg", "amg"], default="mmsr", help = "--task portfolio stops once a task that proves this goal completes: mmsr - a minimum MSR, amsr - all MSRs, mmg - a minimum MG, amg - all MGs.")
     parser.add_argument("--run_imitator_on_mg", action='store_true', help="After fnding minimal guarantee, runs imitator on it. This value does not have effect if any task other than mmg is selected.")
     parser.add_argument("--run_imitator_on_msr", action='store_true', help="After finding minimal msrs, runs imitator on them and their union.")
     parser.add_argument("--run_imitator_on_every_mmsr", action='store_true', help="After finding minimal msrs, runs imitator on them and their union.")
     parser.add_argument("--run_imitator_on_partition", action='store_true', help="After finding minimal msrs, runs imitator on them and their union.")
     parser.add_argument("--path-analysis", action='store_true', help = "Use path analysis to further shrink reduction cores.")
+    parser.add_argument("--path-backend", choices=["lp", "graph"], default="lp", help = "How the realizability of a path is decided by the path analysis (see --path-analysis and the tasks pasba and maxpasba): lp - a GLOP LP over the delays, graph - negative cycle detection by Bellman-Ford in the difference constraint graph of the prefix sums of the delays, without OR-tools.")
     parser.add_argument("--multiple-path-cores", action='store_true', help = "Extract multiple MUSes from a single witness path.")
+    parser.add_argument("--no-cache", action='store_true', help = "Do not answer reachability checks from the results of previous checks.")
+    parser.add_argument("--emit-dir", default="/dev/shm", help = "Directory of the relaxed models passed to verifyta; a RAM-backed one is recommended. The system temporary directory is used if it does not exist.")
+    parser.add_argument("--memfd", action='store_true', help = "Keep the relaxed models in anonymous memory files (memfd_create) linked from the --emit-dir directory.")
+    parser.add_argument("--workers", type=int, default=1, help = "Number of reachability checks (verifyta processes) that shrink and grow run concurrently; with --task pmarco, the number of worker processes.")
+    parser.add_argument("--master-model", action='store_true', help = "Render the model only once, with a const bool flag for every guard constraint, and obtain the relaxed models passed to verifyta by setting the flags and splicing the relaxed invariants.")
+    parser.add_argument("--selector-batch", action='store_true', help = "Answer the concurrent checks of shrink and grow (see --workers) that relax the same invariants by a single verifyta run of a model that selects the relaxation set in its initial state.")
+    parser.add_argument("--shrink-mode", choices=["linear", "quickxplain"], default="linear", help = "How a sufficient reduction is shrunk to an MSR: linear - one constraint is removed per check (--workers checks run concurrently), quickxplain - halves of the candidates are removed per check (QuickXplain), which takes O(k log(n/k)) checks for an MSR of size k out of n constraints.")
+    parser.add_argument("--grow-mode", choices=["linear", "chunked"], default="linear", help = "How an insufficient reduction is grown to the complement of an MG: linear - one constraint is added per check (--workers checks run concurrently), chunked - chunks of constraints are added at once; a chunk doubles after it is added and halves after it makes the reduction sufficient.")
+    parser.add_argument("--rotation", action='store_true', help = "After every found MSR (MG), record that its subsets without one constraint are insufficient (the supersets of the complement of the MG with one more constraint are sufficient) without checks, and mark those of them whose neighbours are all known as new MGs (MSRs), recursively; that needs all the neighbours to be known, hence it rarely saves checks. Supported by the tasks marco, sba and eba, with checks without limits.")
+    parser.add_argument("--check-timelimit", type=float, help = "Wall-clock limit (in seconds) of a single reachability check. A check that exceeds it is undecided: its seed is revisited later with doubled limits.")
+    parser.add_argument("--check-memlimit", type=int, help = "Memory limit (in megabytes) of a single verifyta process, see --check-timelimit.")
+    parser.add_argument("--check-retries", type=int, default=3, help = "How many times the limits of undecided checks can be doubled.")
+    parser.add_argument("--explorer", choices=["z3", "bitset"], default="z3", help = "The map of the explored reductions: z3 - every query is a SAT call, bitset - the block-ups and block-downs are also kept as bitsets, hence only the search for a new seed calls the SAT solver.")
+    parser.add_argument("--sat-backend", choices=sat_backends.BACKENDS, default="z3", help = "The SAT solver of the explorer. z3 (the default) keeps the z3-based explorer; the other backends are incremental CDCL solvers of python-sat over integer literals, with their own cardinality encodings (see benchmark_explorer.py).")
+    parser.add_argument("--seed-extraction", choices=["greedy", "maxsat"], default="greedy", help = "How the explorer maximizes and minimizes the seeds: greedy - one membership query per constraint, maxsat - a single call of z3's Optimize that finds a maximum (minimum) unexplored superset (subset) of the seed.")
+    parser.add_argument("--cardinality-encoding", choices=["pb", "totalizer"], default="pb", help = "How the explorer bounds the cardinality of seeds: pb - a pseudo-Boolean constraint added and removed for every call, totalizer - a totalizer encoded once (lazily extended), whose outputs are assumed.")
+    parser.add_argument("--stats-json", help = "Write the statistics, including the percentiles of the wall-clock times of the phases of the checks (relaxation, serialization, file write, verifyta wall-clock and CPU time, trace parsing, core and path analysis), to the given file as JSON.")
+    parser.add_argument("--checkpoint-dir", help = "Periodically save the state of the enumeration (the explored reductions, the found MSRs and MGs with their traces, the results of the checks, the statistics) to a file in the given directory that is named by a hash of the model, the query, the template and the task.")
+    parser.add_argument("--checkpoint-interval", type=float, default=60, help = "Seconds between two checkpoints, see --checkpoint-dir.")
+    parser.add_argument("--resume", action='store_true', help = "Continue the enumeration saved by a previous run with the same model, query, template and task in --checkpoint-dir (the current directory by default).")
+    parser.add_argument("--jsonl", help = "Write every found MSR and MG (its constraints, the trace of an MSR, the number of checks and the elapsed time) as a JSON object on its own line to the given file as soon as it is found; the last line sums up the run.")
+    parser.add_argument("--checker", choices=["verifyta", "native", "incremental"], default="verifyta", help = "The reachability checker: verifyta - UPPAAL in a separate process, native - the built-in zone graph exploration (a fragment of UPPAAL, see uppaalHelpers/native_checker.py), incremental - the built-in one that resumes the last unreachable exploration when the relaxation set grows.")
     args = parser.parse_args()
 
     #run the computation
@@ -714,10 +1552,61 @@ if __name__ == '__main__':
     t.timelimit = args.msr_timelimit if args.msr_timelimit != None else 1000000 
     t.verbosity = args.verbose if args.verbose != None else 0
     t.task = args.task
+    t.strategies = args.portfolio
+    t.portfolio_goal = args.portfolio_goal
+    if args.task == "portfolio" and not set(args.portfolio) & set(PROVES[args.portfolio_goal]):
+        parser.error("none of the --portfolio tasks proves the goal " + args.portfolio_goal)
     t.usePathAnalysis = args.path_analysis
+    t.path_backend = args.path_backend
     t.useMultiplePathCores = args.multiple_path_cores
+    t.workers = max(1, args.workers)
+    t.shrink_mode = args.shrink_mode
+    t.grow_mode = args.grow_mode
+    t.rotation = args.rotation
+    if args.rotation and (args.check_timelimit is not None or args.check_memlimit is not None):
+        parser.error("--rotation needs checks without limits (--check-timelimit, --check-memlimit)")
+    if args.rotation and args.task not in ["marco", "sba", "eba"]:
+        parser.error("--rotation is supported by the tasks marco, sba and eba")
+    t.check_timelimit = args.check_timelimit
+    t.check_memlimit = args.check_memlimit
+    t.check_retries = args.check_retries
+    if args.explorer == "bitset":
+        t.explorer = BitsetExplorer(t.dimension)
+    if args.sat_backend != "z3":
+        if args.explorer == "bitset" or args.seed_extraction == "maxsat":
+            parser.error("--explorer bitset and --seed-extraction maxsat need --sat-backend z3")
+        t.explorer = LiteralExplorer(t.dimension, sat_backends.make_backend(args.sat_backend))
+    if args.cardinality_encoding == "totalizer":
+        t.explorer.use_totalizer()
+    if args.seed_extraction == "maxsat":
+        t.explorer.use_optimizer()
+    if args.no_cache:
+        t.cache = None
+    t.emitter = ModelEmitter(args.emit_dir, args.memfd)
+    if args.master_model:
+        t.master = MasterModel(t.model, t.TA)
+    if args.selector_batch:
+        t.selector = SelectorModel(t.model, t.TA, query_file)
+    if args.checker in ["native", "incremental"]:
+        t.native = NativeChecker(t.model, t.TA, query_file, args.checker == "incremental")
+    if args.jsonl:
+        jsonl = open(args.jsonl, 'w')
+        def write_event(event):
+            jsonl.write(json.dumps(event, default = str) + "\n")
+            jsonl.flush()
+        t.listeners.append(write_event)
     print "Model: ", model, ", query: ", query_file
     print "dimension:", t.dimension
+    if args.checkpoint_dir or args.resume:
+        t.checkpoint_file = checkpoint.checkpoint_path(args.checkpoint_dir or ".", model, query_file, template_name, args.task)
+        t.checkpoint_interval = args.checkpoint_interval
+    if args.resume:
+        state = checkpoint.load(t.checkpoint_file)
+        if state is None:
+            print "no checkpoint found at", t.checkpoint_file, "- starting from scratch"
+        else:
+            t.restore(state)
+            print "resumed from", t.checkpoint_file, "with", len(t.msres), "MSRs and", len(t.mgs), "MGs"
     print "is the target location reachable?", t.is_sufficient([])[0]
     print ""
     t.run()
@@ -725,3 +1614,5 @@ if __name__ == '__main__':
 
     if t.verbosity > 0:
         t.print_statistics()
+    if args.stats_json:
+        t.dump_statistics(args.stats_json)
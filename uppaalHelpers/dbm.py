@@ -0,0 +1,88 @@
+"""Difference bound matrices backed by NumPy arrays.
+
+A zone over the clocks x_1, ..., x_n is a (n+1)x(n+1) matrix D, where D[i][j] bounds x_i - x_j (x_0 is the constant 0).
+The bounds are encoded as integers as in UPPAAL: (c, <=) is 2c + 1 and (c, <) is 2c, hence a smaller integer is a
+tighter bound. The matrices are kept canonical (closed) by every operation."""
+import numpy as np
+
+INF = 1 << 40  # no bound
+INFINITE = INF >> 1  # sums of INF with finite bounds stay above this value until they are normalized
+LE_ZERO = 1  # (0, <=)
+
+
+def bound(c, strict=False):
+    return 2 * c + (0 if strict else 1)
+
+
+def add(a, b):
+    """Sum of (arrays of) bounds; the sum is strict if any of the bounds is strict.
+    The sums with INF are not normalized, see normalize."""
+    return a + b - ((a | b) & 1)
+
+
+def normalize(D):
+    D[D > INFINITE] = INF
+
+
+def zero(n):
+    """The zone of n clocks that all equal zero."""
+    return np.full((n + 1, n + 1), LE_ZERO, dtype=np.int64)
+
+
+def close(D):
+    """Floyd-Warshall closure; returns False iff the zone is empty."""
+    for k in range(D.shape[0]):
+        np.minimum(D, add(D[:, k:k + 1], D[k:k + 1, :]), out=D)
+    normalize(D)
+    return not is_empty(D)
+
+
+def is_empty(D):
+    return bool((np.diagonal(D) < LE_ZERO).any())
+
+
+def up(D):
+    """Delay: removes the upper bounds of all clocks."""
+    D[1:, 0] = INF
+
+
+def constrain(D, i, j, b):
+    """Intersects the zone with x_i - x_j < or <= b (a bound); returns False iff the result is empty."""
+    back = int(D[j, i])
+    if back < INFINITE and add(back, b) < LE_ZERO:
+        D[0, 0] = -INF
+        return False
+    if b < D[i, j]:
+        D[i, j] = b
+        # incremental closure through the tightened entry
+        np.minimum(D, add(add(D[:, i:i + 1], b), D[j:j + 1, :]), out=D)
+        normalize(D)
+    return True
+
+
+def reset(D, x, value=0):
+    """Sets the clock x to value."""
+    D[x, :] = add(bound(value), D[0, :])
+    D[:, x] = add(D[:, 0], bound(-value))
+    D[x, x] = LE_ZERO
+    normalize(D)
+
+
+def extrapolate(D, M):
+    """Maximal bounds extrapolation (Extra_M), M[i] is the largest constant compared with the clock i (M[0] = 0)."""
+    M = np.asarray(M, dtype=np.int64)
+    upper = (2 * M + 1)[:, None]  # (M_i, <=)
+    lower = (-2 * M)[None, :]  # (-M_j, <)
+    too_high = (D > upper) & (D < INF)
+    too_low = D < lower
+    np.fill_diagonal(too_high, False)
+    np.fill_diagonal(too_low, False)
+    if too_high.any() or too_low.any():
+        D[too_high] = INF
+        D[too_low] = (lower + np.zeros_like(D))[too_low]
+        close(D)
+
+
+def includes(D1, D2):
+    """True iff the zone D2 is a subset of the zone D1."""
+    return bool((D2 <= D1).all())
@@ -0,0 +1,110 @@
+"""A model of the network that is rendered to XML only once and encodes every relaxation of its constraints.
+
+Every registered guard constraint c becomes (c || R_K), where R_K is a const bool flag declared in the global
+declaration, hence a relaxation of the guards only changes the values of the flags. UPPAAL does not allow disjunctions
+in invariants, so the invariants with registered constraints are slots of the rendered model that are filled with the
+relaxed invariants. A relaxed model is then obtained by splicing the flag declarations and the invariants into the
+pre-rendered model, without copying the templates and serializing the network."""
+import cgi
+import copy
+import re
+
+import pyuppaal
+
+DECLARATION_SLOT = '@@tamus_flags@@'
+INVARIANT_SLOT = '@@tamus_invariant_%d@@'
+
+
+class MasterModel:
+    flag_format = '%s'  # the expression of a flag in the guards
+
+    def __init__(self, nta, TA):
+        """
+        :param nta: the network, the templates of TA replace the templates of the same names
+        :param TA: TimedAutomata, the registered constraints of its templates can be relaxed
+        """
+        self.TA = TA
+        if re.search(r'\bR_\d+\b', nta.declaration + nta.system + ''.join([t.declaration for t in nta.templates])):
+            raise ValueError("The model declares identifiers of the form R_<number> that are used as flags.")
+        # a flag for each registered (constraint, key); equal constraints of a key are relaxed together,
+        # see TimedAutomata.generate_relaxed_templates
+        self.flags = dict()  # (constraint, key) : flag
+        self.flag_of = dict()  # constraint id : flag
+        invariant_keys = set()
+        for cid in sorted(TA.constraint_registry, key=lambda c: int(c[1:])):
+            constraint, key = TA.constraint_registry[cid]
+            if len(key) == 4:
+                self.flag_of[cid] = self.flags.setdefault((constraint, key), 'R_' + cid[1:])
+            else:
+                invariant_keys.add(key)
+        self.flag_names = sorted(self.flags.values(), key=lambda f: int(f[2:]))
+        self.invariants = []  # slot : (key, invariant)
+        self.slot_of = dict()  # key : [slots]
+
+        replaced = dict((t.name, t) for t in TA.templates)
+        templates = [copy.deepcopy(replaced.get(t.name, t)) for t in nta.templates]
+        for template in templates:
+            for t in template.transitions:
+                key = (template.name, t.source.name.value, t.target.name.value, t.synchronisation.value)
+                if t.guard.value:
+                    t.guard.value = '&&'.join(['(%s || %s)' % (c, self.flag_format % self.flags[(c, key)])
+                                               if (c, key) in self.flags
+                                               else c for c in t.guard.value.split('&&')])
+            for l in template.locations:
+                key = (template.name, l.name.value)
+                if l.invariant.value and key in invariant_keys:
+                    self.slot_of.setdefault(key, []).append(len(self.invariants))
+                    self.invariants.append((key, l.invariant.value))
+                    l.invariant.value = INVARIANT_SLOT % (len(self.invariants) - 1)
+        xml_string = self.network(nta, templates).to_xml()
+
+        # the rendered model is split into the constant parts and the slots, the slots of the invariants are the
+        # whole labels since an empty invariant is not rendered
+        self.parts = []
+        self.label_attributes = []  # slot : attributes of the label
+        position = xml_string.index(DECLARATION_SLOT)
+        self.parts.append(xml_string[:position])
+        position += len(DECLARATION_SLOT)
+        for slot in range(len(self.invariants)):
+            match = re.compile(r'<label ([^>]*)>%s</label>' % re.escape(INVARIANT_SLOT % slot)).search(xml_string,
+                                                                                                        position)
+            self.parts.append(xml_string[position:match.start()])
+            self.label_attributes.append(match.group(1))
+            position = match.end()
+        self.parts.append(xml_string[position:])
+
+    def network(self, nta, templates):
+        """The network that is rendered, with the slot of the declarations of the flags."""
+        return pyuppaal.NTA(DECLARATION_SLOT + "\n" + nta.declaration, nta.system, templates)
+
+    def relaxed_flags(self, relax_set):
+        return set([self.flag_of[cid] for cid in relax_set if cid in self.flag_of])
+
+    def relaxed_invariants(self, relax_set):
+        """The constraint ids of the relax set that are invariants."""
+        return [cid for cid in relax_set if cid not in self.flag_of]
+
+    def render(self, relax_set):
+        """Returns the XML of the model with the constraints of the relax set relaxed."""
+        relaxed_flags = self.relaxed_flags(relax_set)
+        declaration = "".join(["const bool %s = %s;\n" % (flag, 'true' if flag in relaxed_flags else 'false')
+                               for flag in self.flag_names])
+        return self.splice(declaration, self.relaxed_invariants(relax_set))
+
+    def splice(self, declaration, invariant_relax_set):
+        """The rendered model with the declaration in the declaration slot and the invariants relaxed."""
+        relaxed_invariants = dict()  # slot : [constraints]
+        for cid in invariant_relax_set:
+            constraint, key = self.TA.constraint_registry[cid]
+            for slot in self.slot_of.get(key, []):
+                relaxed_invariants.setdefault(slot, []).append(constraint)
+        chunks = [self.parts[0], declaration]
+        for slot in range(len(self.invariants)):
+            chunks.append(self.parts[slot + 1])
+            invariant = self.invariants[slot][1]
+            if slot in relaxed_invariants:
+                invariant = self.TA._relax_constraint(invariant, relaxed_invariants[slot])
+            if invariant:
+                chunks.append('<label %s>%s</label>' % (self.label_attributes[slot], cgi.escape(invariant)))
+        chunks.append(self.parts[-1])
+        return "".join(chunks)
@@ -0,0 +1,72 @@
+"""Writing of candidate models for verifyta.
+
+Every emitted model gets its own file, hence any number of checks (of the same model) can run at the same time.
+By default, the files are created in a RAM-backed directory, and they are removed once released or at exit."""
+import atexit
+import ctypes
+import ctypes.util
+import os
+import tempfile
+
+
+def memfd_create(name):
+    """Returns a file descriptor of a new anonymous file, or None if memfd_create(2) is not available."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.memfd_create(name, 0)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    return fd
+
+
+class ModelEmitter:
+
+    def __init__(self, directory='/dev/shm', use_memfd=False, prefix='tamus_'):
+        """
+        :param directory: the directory of the emitted files, the system temporary directory is used if it does not exist
+        :param use_memfd: keep the models in anonymous memory files; the emitted paths are then symbolic links
+                          (in directory) to /proc/<pid>/fd/<fd> of these files
+        :param prefix: prefix of the names of the emitted files
+        """
+        if not directory or not os.path.isdir(directory):
+            directory = tempfile.gettempdir()
+        self.directory = directory
+        self.use_memfd = use_memfd
+        self.prefix = prefix
+        self.emitted = dict()  # path : file descriptor of the memory file or None
+        self.counter = 0
+        atexit.register(self.cleanup)
+
+    def emit(self, xml_string, suffix='.xml'):
+        """Writes the model (or a query file, given the suffix) and returns the path of the file."""
+        if self.use_memfd:
+            fd = memfd_create(self.prefix)
+            if fd is not None:
+                os.write(fd, xml_string)
+                self.counter += 1
+                path = os.path.join(self.directory, "%s%d_%d%s" % (self.prefix, os.getpid(), self.counter, suffix))
+                os.symlink("/proc/%d/fd/%d" % (os.getpid(), fd), path)
+                self.emitted[path] = fd
+                return path
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix=self.prefix, dir=self.directory)
+        new_ta_file = os.fdopen(fd, 'w')
+        new_ta_file.write(xml_string)
+        new_ta_file.close()
+        self.emitted[path] = None
+        return path
+
+    def release(self, path):
+        """Removes an emitted file."""
+        fd = self.emitted.pop(path, None)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        if fd is not None:
+            os.close(fd)
+
+    def cleanup(self):
+        for path in self.emitted.keys():
+            self.release(path)
@@ -0,0 +1,566 @@
+"""In-process symbolic reachability checking of networks of timed automata, an alternative to verifyta.
+
+The zone graph of the network is explored breadth-first with a passed/waiting list, zone inclusion checking and
+maximal bounds extrapolation, see dbm. The supported fragment of UPPAAL is: global and local clocks, int and bool
+variables, constants, binary and broadcast channels, urgent and committed locations, and queries E<> over conjunctions
+of locations and data conditions. Clocks can only be compared with constant expressions and reset to constants.
+Anything else is rejected with a ValueError when the checker is constructed."""
+import re
+import time
+import itertools
+from collections import deque
+
+import dbm
+import ta_helper
+
+TOKEN = re.compile(r'\s*(?:(\d+)|([A-Za-z_]\w*)|(&&|\|\||==|!=|<=|>=|\+=|-=|\+\+|--|[-+*/%<>!()=,?:\[\]{}.]))')
+IDENTIFIER = re.compile(r'[A-Za-z_]\w*$')
+CLOCK_CONSTRAINT = re.compile(r'\s*([A-Za-z_]\w*)\s*(<=|>=|<|>|==)(.*)$')
+DECLARATION = re.compile(r'(const\s+)?(?:(clock|int|bool)\s*(\[[^\]]*\])?|((?:(?:urgent|broadcast)\s+)*chan))\s+(.*)$',
+                         re.DOTALL)
+PYTHON_OPERATORS = {'&&': ' and ', '||': ' or ', '!': ' not ', '/': '//',
+                    'and': ' and ', 'or': ' or ', 'not': ' not ', 'true': ' True ', 'false': ' False '}
+
+
+def strip_comments(text):
+    text = re.sub(r'/\*.*?\*/', ' ', text or "", flags=re.DOTALL)
+    return re.sub(r'//[^\n]*', ' ', text)
+
+
+def tokenize(expression):
+    tokens = []
+    expression = expression.strip()
+    position = 0
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if match is None:
+            raise ValueError("Cannot parse the expression: " + expression)
+        tokens.append(match.group(1) or match.group(2) or match.group(3))
+        position = match.end()
+    return tokens
+
+
+class Scope:
+    """Names of clocks, variables, constants and channels visible in a process (or globally)."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.names = dict()  # name : (kind, value), kind is one of 'clock', 'var', 'const', 'chan'
+
+    def lookup(self, name):
+        if name in self.names:
+            return self.names[name]
+        if self.parent is not None:
+            return self.parent.lookup(name)
+        raise ValueError("Unknown identifier: " + name)
+
+    def is_clock(self, name):
+        try:
+            return self.lookup(name)[0] == 'clock'
+        except ValueError:
+            return False
+
+    def to_python(self, expression):
+        """Translates a side-effect free UPPAAL expression to python; variables are read from the list v."""
+        code = []
+        for token in tokenize(expression):
+            if token in PYTHON_OPERATORS:
+                code.append(PYTHON_OPERATORS[token])
+            elif token[0].isdigit():
+                code.append(token)
+            elif IDENTIFIER.match(token):
+                kind, value = self.lookup(token)
+                if kind == 'const':
+                    code.append(repr(value))
+                elif kind == 'var':
+                    code.append('v[%d]' % value)
+                else:
+                    raise ValueError("Unsupported use of the %s %s in %s" % (kind, token, expression))
+            elif token in ['+', '-', '*', '%', '<', '>', '<=', '>=', '==', '!=', '(', ')']:
+                code.append(token)
+            else:
+                raise ValueError("Unsupported operator %s in %s" % (token, expression))
+        return ' '.join(code)
+
+    def compile(self, expression):
+        """Returns a function of the list of variable values that evaluates the expression."""
+        return eval('lambda v: ' + self.to_python(expression), {'__builtins__': {}})
+
+    def evaluate(self, expression):
+        """Evaluates a constant expression."""
+        return self.compile(expression)([])
+
+
+class Network:
+    """Clocks, variables and processes of a network, built from the declarations and the system of an NTA."""
+
+    def __init__(self):
+        self.scope = Scope()
+        self.clock_count = 0
+        self.initial_variables = []
+
+    def declare(self, text, scope):
+        for statement in strip_comments(text).split(';'):
+            statement = statement.strip()
+            if not statement:
+                continue
+            match = DECLARATION.match(statement)
+            if match is None or '{' in statement or '(' in statement.split('=')[0]:
+                raise ValueError("Unsupported declaration: " + statement)
+            const, kind, _, channel, declarators = match.groups()
+            for declarator in declarators.split(','):
+                name, _, initializer = declarator.partition('=')
+                name = name.strip()
+                if not IDENTIFIER.match(name):
+                    raise ValueError("Unsupported declaration: " + statement)
+                if channel is not None:
+                    if 'urgent' in channel:
+                        raise ValueError("Urgent channels are not supported: " + statement)
+                    scope.names[name] = ('chan', (id(scope), name, 'broadcast' in channel))
+                elif kind == 'clock':
+                    self.clock_count += 1
+                    scope.names[name] = ('clock', self.clock_count)
+                elif const:
+                    scope.names[name] = ('const', scope.evaluate(initializer))
+                else:
+                    value = scope.evaluate(initializer) if initializer.strip() else 0
+                    scope.names[name] = ('var', len(self.initial_variables))
+                    self.initial_variables.append(value)
+
+    def instances(self, system, templates):
+        """Returns the list of (instance name, template) of the system declaration."""
+        templates = dict((t.name, t) for t in templates)
+        instantiations = dict()
+        processes = []
+        for statement in strip_comments(system).split(';'):
+            statement = statement.strip()
+            if not statement:
+                continue
+            if re.match(r'system\s', statement):
+                if '<' in statement:
+                    raise ValueError("Process priorities are not supported: " + statement)
+                processes += [p.strip() for p in statement[len('system'):].split(',')]
+            elif re.match(r'[A-Za-z_]\w*\s*=\s*[A-Za-z_]\w*\s*\(\s*\)$', statement):
+                name, template = statement.split('=')
+                instantiations[name.strip()] = template.strip()[:-2].strip()
+            elif re.match(r'[A-Za-z_]\w*\s*=', statement):
+                raise ValueError("Parametrized templates are not supported: " + statement)
+            else:
+                self.declare(statement, self.scope)
+        result = []
+        for p in processes:
+            template = templates[instantiations.get(p, p)]
+            if template.parameter:
+                raise ValueError("Parametrized templates are not supported: " + template.name)
+            result.append((p, template))
+        return result
+
+
+class ClockConstraint:
+    """x op value, text is the constraint as it appears in the guard/invariant (see TimedAutomata registry)."""
+
+    def __init__(self, text, clock, op, value):
+        self.text = text
+        self.clock = clock
+        self.op = op
+        self.value = value
+
+    def apply(self, D):
+        """Intersects the zone with the constraint; returns False iff the result is empty."""
+        x, v = self.clock, self.value
+        if self.op in ['<=', '<']:
+            return dbm.constrain(D, x, 0, dbm.bound(v, self.op == '<'))
+        if self.op in ['>=', '>']:
+            return dbm.constrain(D, 0, x, dbm.bound(-v, self.op == '>'))
+        return dbm.constrain(D, x, 0, dbm.bound(v)) and dbm.constrain(D, 0, x, dbm.bound(-v))
+
+
+def split_constraints(label, scope):
+    """Splits a guard/invariant into the list of clock constraints and a function evaluating the rest (or None)."""
+    clock_constraints = []
+    data = []
+    for text in (label or "").split('&&'):
+        if not text.strip() or text.strip() == 'true':
+            continue
+        clocks = [t for t in tokenize(text) if IDENTIFIER.match(t) and scope.is_clock(t)]
+        if not clocks:
+            data.append(text)
+            continue
+        match = CLOCK_CONSTRAINT.match(text)
+        if match is None or len(clocks) > 1 or match.group(1) != clocks[0]:
+            raise ValueError("Unsupported clock constraint: " + text)
+        clock_constraints.append(ClockConstraint(text, scope.lookup(clocks[0])[1], match.group(2),
+                                                 scope.evaluate(match.group(3))))
+    return clock_constraints, (scope.compile(' && '.join(data)) if data else None)
+
+
+class Edge:
+
+    def __init__(self, process, template, transition, source, target, scope):
+        self.process = process
+        self.source = source
+        self.target = target
+        self.sync = transition.synchronisation.value
+        self.key = (template.name, transition.source.name.value, transition.target.name.value, self.sync)
+        self.guard, self.data_guard = split_constraints(transition.guard.value, scope)
+        self.channel, self.direction = None, None
+        if self.sync and self.sync.strip():
+            name = self.sync.strip()
+            self.channel, self.direction = scope.lookup(name[:-1].strip()), name[-1]
+            if self.channel[0] != 'chan' or self.direction not in ['!', '?']:
+                raise ValueError("Unsupported synchronisation: " + self.sync)
+            self.channel = self.channel[1]
+        self.resets = []  # (clock, value)
+        self.updates = []  # (variable, operator, function)
+        for assignment in (transition.assignment.value or "").split(','):
+            assignment = assignment.strip()
+            if not assignment:
+                continue
+            match = re.match(r'([A-Za-z_]\w*)\s*(:=|=|\+=|-=|\+\+|--)(.*)$', assignment)
+            if match is None:
+                raise ValueError("Unsupported assignment: " + assignment)
+            name, operator, expression = match.groups()
+            kind, value = scope.lookup(name)
+            if kind == 'clock':
+                if operator not in [':=', '=']:
+                    raise ValueError("Unsupported clock assignment: " + assignment)
+                self.resets.append((value, scope.evaluate(expression)))
+            elif kind == 'var':
+                if operator in ['++', '--']:
+                    operator, expression = operator[0] + '=', '1'
+                self.updates.append((value, operator, scope.compile(expression)))
+            else:
+                raise ValueError("Unsupported assignment: " + assignment)
+
+    def update(self, variables):
+        for variable, operator, function in self.updates:
+            value = function(variables)
+            if operator == '+=':
+                value = variables[variable] + value
+            elif operator == '-=':
+                value = variables[variable] - value
+            variables[variable] = value
+
+
+class NativeChecker:
+    """Checks the query of a network for relaxations of the constraints registered in a TimedAutomata.
+
+    In the incremental mode, the checker keeps the explored zone graph of the last relaxation set for which the query
+    was not reachable. Relaxing more constraints only enlarges the zones, hence a check of a superset of that relaxation
+    set resumes the search from the stored passed list: only the nodes whose successors (or zone) are affected by the
+    newly relaxed constraints are explored again."""
+
+    def __init__(self, nta, TA, query_file_path, incremental=False):
+        self.TA = TA
+        self.incremental = incremental
+        self.snapshot = None  # (relaxed constraints, nodes, passed) of the last unreachable exploration
+        self.resumed = 0  # number of checks that resumed a stored exploration
+        self.deadline = None  # the search is interrupted at this time
+        network = Network()
+        network.declare(nta.declaration, network.scope)
+        self.processes = []  # instance names
+        self.templates = []  # template names
+        self.location_names = []  # process : [location names]
+        self.initial = []
+        self.urgent = []  # process : [urgent or committed]
+        self.committed = []  # process : [committed]
+        self.invariants = []  # process : [clock constraints]
+        self.edges = []  # process : location : [edges]
+        for process, (name, template) in enumerate(network.instances(nta.system, nta.templates)):
+            scope = Scope(network.scope)
+            network.declare(template.declaration, scope)
+            locations = [l for l in template.locations]
+            if [l for l in locations if not hasattr(l, 'invariant')]:
+                raise ValueError("Branchpoints are not supported: " + template.name)
+            index = dict((id(l), i) for i, l in enumerate(locations))
+            self.processes.append(name)
+            self.templates.append(template.name)
+            self.location_names.append([l.name.value for l in locations])
+            self.initial.append(index[id(template.initlocation)])
+            self.urgent.append([l.urgent or l.committed for l in locations])
+            self.committed.append([l.committed for l in locations])
+            invariants = []
+            for l in locations:
+                constraints, data = split_constraints(l.invariant.value, scope)
+                if data is not None:
+                    raise ValueError("Invariants over variables are not supported: " + l.invariant.value)
+                invariants.append(constraints)
+            self.invariants.append(invariants)
+            edges = [[] for _ in locations]
+            for t in template.transitions:
+                e = Edge(process, template, t, index[id(t.source)], index[id(t.target)], scope)
+                if e.direction == '?' and e.channel[2] and e.guard:
+                    raise ValueError("Clock guards on broadcast receivers are not supported: " + t.guard.value)
+                edges[e.source].append(e)
+            self.edges.append(edges)
+        self.clock_count = network.clock_count
+        self.initial_variables = tuple(network.initial_variables)
+        self.max_constants = [0] * (self.clock_count + 1)
+        for c in self.all_constraints():
+            self.max_constants[c.clock] = max(self.max_constants[c.clock], abs(c.value))
+        for e in self.all_edges():
+            for clock, value in e.resets:
+                self.max_constants[clock] = max(self.max_constants[clock], abs(value))
+        self.target_locations, self.target_data = self.parse_query(query_file_path, network.scope)
+        self.index = ta_helper.TraceIndex(nta, TA.constraint_registry)
+
+    def all_edges(self):
+        return [e for edges in self.edges for location_edges in edges for e in location_edges]
+
+    def all_constraints(self):
+        constraints = [c for e in self.all_edges() for c in e.guard]
+        return constraints + [c for invariants in self.invariants for i in invariants for c in i]
+
+    def parse_query(self, query_file_path, scope):
+        with open(query_file_path) as query_file:
+            query = strip_comments(query_file.read()).strip().split('\n')[0].strip()
+        if not query.startswith('E<>'):
+            raise ValueError("Only E<> queries are supported: " + query)
+        locations = []
+        data = []
+        for atom in query[3:].split('&&'):
+            match = re.match(r'\s*\(?\s*([A-Za-z_]\w*)\.([A-Za-z_]\w*)\s*\)?\s*$', atom)
+            if match is not None and match.group(1) in self.processes:
+                process = self.processes.index(match.group(1))
+                locations.append((process, self.location_names[process].index(match.group(2))))
+            else:
+                data.append(atom)
+        return locations, (scope.compile(' && '.join(data)) if data else None)
+
+    def relaxed_constraints(self, relaxation_set):
+        """The set of (key, constraint) of the relaxation set, see TimedAutomata.constraint_registry."""
+        relaxed = set()
+        for cid in relaxation_set:
+            constraint, key = self.TA.constraint_registry[cid]
+            relaxed.add((key, constraint))
+        return relaxed
+
+    def relax(self, relaxed):
+        """Returns the clock constraints of the guards (edge : constraints) and invariants (process : location :
+        constraints) that remain after the relaxed constraints are removed."""
+        guards = dict()
+        for e in self.all_edges():
+            guards[e] = [c for c in e.guard if (e.key, c.text) not in relaxed]
+        invariants = []
+        for process in range(len(self.processes)):
+            template = self.templates[process]
+            invariants.append([[c for c in self.invariants[process][l]
+                                if ((template, self.location_names[process][l]), c.text) not in relaxed]
+                               for l in range(len(self.location_names[process]))])
+        return guards, invariants
+
+    def is_target(self, locations, variables):
+        for process, location in self.target_locations:
+            if locations[process] != location:
+                return False
+        return self.target_data is None or bool(self.target_data(list(variables)))
+
+    def delay(self, locations, zone, invariants):
+        """Applies the invariants, lets time elapse (unless a location is urgent) and extrapolates;
+        returns False iff the zone is empty."""
+        for process, location in enumerate(locations):
+            for c in invariants[process][location]:
+                if not c.apply(zone):
+                    return False
+        if not [p for p, l in enumerate(locations) if self.urgent[p][l]]:
+            dbm.up(zone)
+            for process, location in enumerate(locations):
+                for c in invariants[process][location]:
+                    if not c.apply(zone):
+                        return False
+        dbm.extrapolate(zone, self.max_constants)
+        return True
+
+    def moves(self, locations, variables):
+        """Enabled combinations of edges (w.r.t. data guards): internal edges, binary and broadcast synchronisations."""
+        committed = set(p for p, l in enumerate(locations) if self.committed[p][l])
+
+        def enabled(e):
+            return e.data_guard is None or e.data_guard(variables)
+
+        for process, location in enumerate(locations):
+            for e in self.edges[process][location]:
+                if e.direction == '?' or not enabled(e):
+                    continue
+                if e.direction is None:
+                    combinations = [[e]]
+                elif not e.channel[2]:
+                    combinations = [[e, f] for q, l in enumerate(locations) if q != process
+                                    for f in self.edges[q][l] if f.channel == e.channel and f.direction == '?' and
+                                    enabled(f)]
+                else:
+                    receivers = [[f for f in self.edges[q][l] if f.channel == e.channel and f.direction == '?' and
+                                  enabled(f)] for q, l in enumerate(locations) if q != process]
+                    combinations = [[e] + list(r) for r in itertools.product(*[r for r in receivers if r])]
+                for move in combinations:
+                    if committed and not [f for f in move if f.process in committed]:
+                        continue
+                    yield move
+
+    def successors(self, locations, variables, zone, guards, invariants, affected=None):
+        """Successors of the node; if affected (a set of edges) is given, only by the moves with an affected edge."""
+        for move in self.moves(locations, variables):
+            if affected is not None and not [e for e in move if e in affected]:
+                continue
+            successor = zone.copy()
+            if not all(c.apply(successor) for e in move for c in guards[e]):
+                continue
+            new_variables = list(variables)
+            new_locations = list(locations)
+            for e in move:
+                e.update(new_variables)
+                for clock, value in e.resets:
+                    dbm.reset(successor, clock, value)
+                new_locations[e.process] = e.target
+            new_locations = tuple(new_locations)
+            if self.delay(new_locations, successor, invariants):
+                yield move, new_locations, tuple(new_variables), successor
+
+    def store(self, locations, variables, zone, parent, move):
+        """Adds the node to the passed list unless its zone is included in a passed one; returns its index or None."""
+        covering = self.passed.setdefault((locations, variables), [])
+        for m in covering:
+            if dbm.includes(self.nodes[m][2], zone):
+                return None
+        self.nodes.append((locations, variables, zone, parent, move))
+        covering.append(len(self.nodes) - 1)
+        return len(self.nodes) - 1
+
+    def search(self, guards, invariants, nodes=None, passed=None, waiting=None):
+        """Breadth-first search of the zone graph. A node is (locations, variables, zone, parent node, move);
+        passed maps (locations, variables) to the nodes with these locations and variables.
+        Returns the index of a target node, None, or -1 if the deadline expired."""
+        if nodes is None:
+            self.nodes, self.passed, waiting = [], dict(), deque()
+            locations = tuple(self.initial)
+            zone = dbm.zero(self.clock_count)
+            if self.delay(locations, zone, invariants):
+                waiting.append(self.store(locations, self.initial_variables, zone, None, None))
+                if self.is_target(locations, self.initial_variables):
+                    return 0
+        else:
+            self.nodes, self.passed = nodes, passed
+        while waiting:
+            if self.deadline is not None and time.time() > self.deadline:
+                return -1
+            n = waiting.popleft()
+            locations, variables, zone, _, _ = self.nodes[n]
+            for move, new_locations, new_variables, successor in self.successors(locations, variables, zone,
+                                                                                  guards, invariants):
+                m = self.store(new_locations, new_variables, successor, n, move)
+                if m is None:
+                    continue
+                if self.is_target(new_locations, new_variables):
+                    return m
+                waiting.append(m)
+        return None
+
+    def resume(self, nodes, passed, newly_relaxed, guards, invariants):
+        """Prepares the search of a stored exploration after the newly relaxed constraints were removed: the nodes in
+        a location with a relaxed invariant get their zone delayed again, and the successors of the other nodes by
+        the edges with a relaxed guard or to a location with a relaxed invariant are computed again.
+        Returns the waiting list, or the index of a target node."""
+        self.nodes, self.passed = nodes, passed
+        relaxed_invariants = set()
+        for process in range(len(self.processes)):
+            template = self.templates[process]
+            for l, name in enumerate(self.location_names[process]):
+                if [c for c in self.invariants[process][l] if ((template, name), c.text) in newly_relaxed]:
+                    relaxed_invariants.add((process, l))
+        affected_edges = set()
+        affected = set()  # the sources of the affected edges
+        for e in self.all_edges():
+            if (e.process, e.target) in relaxed_invariants or [c for c in e.guard if (e.key, c.text) in newly_relaxed]:
+                affected_edges.add(e)
+                affected.add((e.process, e.source))
+        waiting = deque()
+        for n in range(len(nodes)):
+            locations, variables, zone, parent, move = nodes[n]
+            positions = [(p, l) for p, l in enumerate(locations)]
+            if [p for p in positions if p in relaxed_invariants]:
+                # the larger zone is explored as a new node, its parent and move stay the same
+                zone = zone.copy()
+                if self.delay(locations, zone, invariants):
+                    m = self.store(locations, variables, zone, parent, move)
+                    if m is not None:
+                        waiting.append(m)
+                        continue
+            if not [p for p in positions if p in affected]:
+                continue
+            for move, new_locations, new_variables, successor in self.successors(locations, variables, zone,
+                                                                                  guards, invariants, affected_edges):
+                m = self.store(new_locations, new_variables, successor, n, move)
+                if m is None:
+                    continue
+                if self.is_target(new_locations, new_variables):
+                    return m
+                waiting.append(m)
+        return waiting
+
+    def rollback(self, size):
+        """Removes the nodes added to the passed list since it had the given size."""
+        for n in range(len(self.nodes) - 1, size - 1, -1):
+            key = self.nodes[n][:2]
+            self.passed[key].pop()
+            if not self.passed[key]:
+                del self.passed[key]
+        del self.nodes[size:]
+
+    def traces(self, node, template_name):
+        """The trace to node in the format of ta_helper.verifyWithTrace."""
+        moves = []
+        while self.nodes[node][3] is not None:
+            moves.append(self.nodes[node][4])
+            node = self.nodes[node][3]
+        trace = dict()
+        for move in reversed(moves):
+            for e in move:
+                process, template = self.processes[e.process], self.templates[e.process]
+                state_1 = self.location_names[e.process][e.source]
+                state_2 = self.location_names[e.process][e.target]
+                if process not in trace:
+                    trace[process] = [(template, state_1)]
+                trace[process].append((template, state_1, state_2, e.sync))
+                trace[process].append((template, state_2))
+        return [trace[p] for p in self.processes
+                if p in trace and (template_name == "All" or self.templates[self.processes.index(p)] == template_name)]
+
+    def verify_reachability(self, relaxation_set, template_name, timelimit=None):
+        """The counterpart of ta_helper.verify_reachability: returns res (1, -1, or 0 if the search exceeded
+        timelimit seconds), the used constraints of the relaxation set and a trace."""
+        self.deadline = time.time() + timelimit if timelimit is not None else None
+        relaxed = self.relaxed_constraints(relaxation_set)
+        guards, invariants = self.relax(relaxed)
+        if not self.incremental:
+            return self.result(self.search(guards, invariants), relaxation_set, template_name)
+        if self.snapshot is not None and self.snapshot[0] <= relaxed and self.snapshot[1]:
+            self.resumed += 1
+            _, nodes, passed = self.snapshot
+            size = len(nodes)
+            waiting = self.resume(nodes, passed, relaxed - self.snapshot[0], guards, invariants)
+            if isinstance(waiting, deque):
+                target = self.search(guards, invariants, nodes, passed, waiting)
+            else:
+                target = waiting
+            result = self.result(target, relaxation_set, template_name)
+            if target is not None:
+                self.rollback(size)  # the stored exploration has to stay valid for its relaxation set
+            else:
+                self.snapshot = (relaxed, nodes, passed)
+            return result
+        target = self.search(guards, invariants)
+        if target is None:
+            self.snapshot = (relaxed, self.nodes, self.passed)
+        return self.result(target, relaxation_set, template_name)
+
+    def result(self, target, relaxation_set, template_name):
+        if target is None:
+            return -1, {}, []
+        if target == -1:
+            return 0, {}, []
+        used_constraints = {}
+        trace = []
+        relaxed = set(relaxation_set)
+        for trace in self.traces(target, template_name):
+            used_constraints = self.index.used_constraints(trace, relaxed, used_constraints)
+        return 1, used_constraints, trace
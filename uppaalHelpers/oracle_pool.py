@@ -0,0 +1,37 @@
+"""A pool of concurrently running verifyta processes."""
+from multiprocessing.pool import ThreadPool
+
+import ta_helper
+
+
+class OraclePool:
+
+    def __init__(self, workers):
+        """Each of the workers drives one verifyta process at a time; the threads only wait for the children,
+        so the checks themselves run in parallel."""
+        self.workers = workers
+        self.pool = ThreadPool(workers)
+
+    def verify(self, jobs, query_file_path, TA, template_name, index=None, limits=None, timer=None):
+        """Verifies a batch of jobs, i.e., (model_file, relaxation_set) pairs, against the query.
+
+        :return: a list of (res, used_constraints, trace) triples in the order of jobs, see verify_reachability.
+        """
+        def run(job):
+            return ta_helper.verify_reachability(job[0], query_file_path, TA, job[1], template_name, index=index,
+                                                 limits=limits, timer=timer)
+        return self.pool.map(run, jobs)
+
+    def verify_selector(self, jobs, TA, template_name, index=None, selector=None, limits=None, timer=None):
+        """Verifies a batch of jobs, i.e., (model_file, query_file, relaxation_sets) triples of selector models.
+
+        :return: a list of lists of (res, used_constraints, trace) triples, see verify_reachability_batch.
+        """
+        def run(job):
+            return ta_helper.verify_reachability_batch(job[0], job[1], TA, job[2], template_name, index=index,
+                                                       selector=selector, limits=limits, timer=timer)
+        return self.pool.map(run, jobs)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
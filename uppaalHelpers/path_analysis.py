@@ -1,11 +1,15 @@
-"""Methods for checking if a path is realizable, and relaxing constraints."""
-from ortools.linear_solver import pywraplp
+"""Methods for checking if a path is realizable, and relaxing constraints.
 
+OR-tools is imported by the LP code only, hence the graph backend (see PathGraph) works without it."""
+import numpy as np
 
-def is_realizable(ta, path, msr=[]):
+
+def is_realizable(ta, path, msr=[], backend="lp"):
     """Given the template, the path, and the msr, check whether its feasible
-    when the constraints from the msr is removed."""
+    when the constraints from the msr is removed. The backend is lp (GLOP) or graph (see PathGraph)."""
     """is_realizable(ta,["l0","l1","l2","l1","l3","l4"])"""
+    if backend == "graph":
+        return PathGraph(ta, path, msr).is_realizable()
     # Get clocks along the path.
     clocks = []
     # for the first location
@@ -15,6 +19,15 @@ def is_realizable(ta, path, msr=[]):
     return result
 
 
+def find_conflict(ta, path, msr=[]):
+    """Given the template, the path, and the msr, returns None if the path is realizable when the constraints from the
+    msr are removed, and otherwise the conflicting constraints along the path as (location, constraint) pairs."""
+    graph = PathGraph(ta, path, msr)
+    if graph.is_realizable():
+        return None
+    return graph.conflict
+
+
 def find_parameters(ta, path, msr):
     """Given the template, the path and mcs find parameters."""
     """example:find_parameters(ta,["l0","l1","l2","l1","l3","l4"],["c18","c17"])"""
@@ -52,6 +65,7 @@ def construct_path_lp(path, clocks, ta, msr, remove_msr=False):
         remove_msr=False: Parametrize the constraints in the MSR and solve an MILP
         remove_msr=True:  Remove the constraints in the MSR and solve an LP
     """
+    from ortools.linear_solver import pywraplp
     length_of_path = len(path) / 2
 
     number_of_variables = length_of_path
@@ -60,66 +74,18 @@ def construct_path_lp(path, clocks, ta, msr, remove_msr=False):
     # assign parameters to constraints in mcs
     constraint_to_parameter = ta.parametrize_msr(msr)
 
-    A = []  # A and B matrices for the optimization
+    A = []  # A and B matrices for the optimization, the rows of A are sparse, see compute_constraint
     B = []
-    clock_to_delay = dict()  # A mapping from clocks to the delay variables,
-    # the dictionary will be updated as we progress along the path.
-    for x in clocks:
-        clock_to_delay[x] = [0]  # set all of them to delay 0 initially.
-
-    for i in range(0, len(path) - 1, 2):
-
-        # Add constraints for the invariant.
-        # Leaving path[i]
-        for c in ta.parsed_invariants[path[i]]:
-            # The constraint is not in the MSR
-            if constraint_to_parameter.get((path[i], c)) is None:
-                a, b = compute_constraint(clock_to_delay, c, number_of_variables, -1)
-            elif not remove_msr:  # The constraint is in the MSR, parametrize it.
-                a, b = compute_constraint(clock_to_delay, c, number_of_variables,
-                                          constraint_to_parameter[(path[i], c)] + length_of_path)
-            else:  # The constraint is in the MSR, and the MSR will be removed
-                a = []
-            for k in range(len(a)):
-                A.append(a[k])
-                B.append(b[k])
-
-        # Add constraints for the guards.
-        for c in ta.parsed_guards[path[i + 1]]:
-            if constraint_to_parameter.get((path[i + 1], c)) is None:  # The constraint is not in the MSR
-                a, b = compute_constraint(clock_to_delay, c, number_of_variables, -1)
-            elif not remove_msr:  # The constraint is in the MSR, parametrize it.
-                a, b = compute_constraint(clock_to_delay, c, number_of_variables,
-                                          constraint_to_parameter[(path[i + 1], c)] + length_of_path)
-            else:  # The constraint is in the MSR, and the MSR will be removed
-                a = []
-            for k in range(len(a)):
-                A.append(a[k])
-                B.append(b[k])
-
-        # Apply reset:
-        for x in ta.resets[path[i + 1]]:
-            clock_to_delay[x] = []  # Reset
-
-        # Add constraints for the invariant.
-        # Entering path[i+1]:
-        for c in ta.parsed_invariants[path[i + 2]]:
-            if constraint_to_parameter.get((path[i + 2], c)) is None:  # The constraint is not in the MSR
-                a, b = compute_constraint(clock_to_delay, c, number_of_variables, -1)
-            elif not remove_msr:  # The constraint is in the MSR, parametrize it.
-                a, b = compute_constraint(clock_to_delay, c, number_of_variables,
-                                          constraint_to_parameter[(path[i + 2], c)] + length_of_path)
-            else:  # The constraint is in the MSR, and the MSR will be removed
-                a = []
-            for k in range(len(a)):
-                A.append(a[k])
-                B.append(b[k])
-
-        # Add delay variable to all clocks
-        for x in clocks:
-            clock_to_delay[x].append(i / 2 + 1)
-
-
+    for location, c, delays in path_constraints(path, clocks, ta):
+        if constraint_to_parameter.get((location, c)) is None:  # The constraint is not in the MSR
+            a, b = compute_constraint({c[0]: delays}, c, -1)
+        elif not remove_msr:  # The constraint is in the MSR, parametrize it.
+            a, b = compute_constraint({c[0]: delays}, c, constraint_to_parameter[(location, c)] + length_of_path)
+        else:  # The constraint is in the MSR, and the MSR will be removed
+            a = []
+        for k in range(len(a)):
+            A.append(a[k])
+            B.append(b[k])
 
     # Construct solver
     if remove_msr:
@@ -139,15 +105,13 @@ def construct_path_lp(path, clocks, ta, msr, remove_msr=False):
             x[j] = solver.NumVar(0, solver.infinity(), 'x[' + str(j) + ']')
         for j in range(length_of_path, length_of_path + len(msr)):
             x[j] = solver.IntVar(0, solver.infinity(), 'x[' + str(j) + ']')
-        # Set the cost:
-        c = [0 for _ in range(length_of_path)] + [1 for _ in range(len(msr))]
-        obj_expr = [c[j] * x[j] for j in range(number_of_variables)]
-        solver.Minimize(solver.Sum(obj_expr))
+        # Set the cost: the sum of the parameters
+        solver.Minimize(solver.Sum([x[j] for j in range(length_of_path, number_of_variables)]))
 
     for i in range(len(A)):
         constraint = solver.RowConstraint(-solver.infinity(), B[i], '')
-        for j in range(number_of_variables):
-            constraint.SetCoefficient(x[j], A[i][j])
+        for j, coefficient in A[i]:
+            constraint.SetCoefficient(x[j], coefficient)
 
     status = solver.Solve()
 
@@ -164,22 +128,223 @@ def construct_path_lp(path, clocks, ta, msr, remove_msr=False):
         return False, delays, parameters
 
 
-def compute_constraint(clock_to_delay, c, number_of_variables, parameter):
+def path_constraints(path, clocks, ta):
+    """The constraints along the path as (location, constraint, delays) triples, in the order of the path. The value of
+    the clock of the constraint is the sum of the delay variables with the indices in delays."""
+    constraints = []
+    clock_to_delay = dict()  # A mapping from clocks to the delay variables,
+    # the dictionary will be updated as we progress along the path.
+    for x in clocks:
+        clock_to_delay[x] = [0]  # set all of them to delay 0 initially.
+
+    for i in range(0, len(path) - 1, 2):
+        # Leaving path[i]
+        for c in ta.parsed_invariants[path[i]]:
+            constraints.append((path[i], c, clock_to_delay[c[0]][:]))
+
+        # The guards.
+        for c in ta.parsed_guards[path[i + 1]]:
+            constraints.append((path[i + 1], c, clock_to_delay[c[0]][:]))
+
+        # Apply reset:
+        for x in ta.resets[path[i + 1]]:
+            clock_to_delay[x] = []  # Reset
+
+        # Entering path[i+1]:
+        for c in ta.parsed_invariants[path[i + 2]]:
+            constraints.append((path[i + 2], c, clock_to_delay[c[0]][:]))
+
+        # Add delay variable to all clocks
+        for x in clocks:
+            clock_to_delay[x].append(i / 2 + 1)
+    return constraints
+
+
+class PathLP:
+    """The LP of a path, built once, in which the constraints of a relaxation set can be removed and restored by
+    toggling the upper bounds of their rows. Initially all constraints of the relaxation set are removed, i.e.,
+    is_realizable() agrees with is_realizable(ta, path, msr). A solve is skipped if the delays of the last feasible
+    solve satisfy the restored constraints."""
+
+    def __init__(self, ta, path, msr):
+        from ortools.linear_solver import pywraplp
+        clocks = []
+        compute_clocks(path, ta, clocks)
+        clocks = sorted(clocks)
+        length_of_path = len(path) / 2
+
+        self.solver = pywraplp.Solver('', pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
+        self.x = [self.solver.NumVar(0, self.solver.infinity(), 'x[' + str(j) + ']') for j in range(length_of_path)]
+        self.solver.Minimize(0)  # no actual cost is defined
+        self.solves = 0
+        self.delays = None  # the solution of the last feasible solve
+        self.restored = []  # the keys restored since then
+
+        self.keys = dict()  # constraint name : (location, parsed constraint), see parametrize_msr
+        for name in msr:
+            c = ta.constraint_registry[name]
+            self.keys[name] = (c[1], ta.parse_inequality_simple(c[0]))
+        self.removed = dict()  # (location, parsed constraint) : number of removed constraints with the key
+        for key in self.keys.values():
+            self.removed[key] = self.removed.get(key, 0) + 1
+
+        self.rows = dict()  # (location, parsed constraint) : list of (row, coefficients, bound)
+        for location, c, delays in path_constraints(path, clocks, ta):
+            a, b = compute_constraint({c[0]: delays}, c, -1)
+            key = (location, c)
+            for k in range(len(a)):
+                removed = self.removed.get(key, 0) > 0
+                row = self.solver.RowConstraint(-self.solver.infinity(), self.solver.infinity() if removed else b[k], '')
+                for j, coefficient in a[k]:
+                    row.SetCoefficient(self.x[j], coefficient)
+                if key in self.removed:
+                    self.rows.setdefault(key, []).append((row, a[k], b[k]))
+
+    def remove(self, name):
+        """Removes the constraint from the path, it has to be in the relaxation set."""
+        key = self.keys[name]
+        self.removed[key] += 1
+        if self.removed[key] == 1:
+            for row, _, _ in self.rows.get(key, []):
+                row.SetUb(self.solver.infinity())
+
+    def restore(self, name):
+        """Restores a removed constraint."""
+        key = self.keys[name]
+        self.removed[key] -= 1
+        if self.removed[key] == 0:
+            for row, _, bound in self.rows.get(key, []):
+                row.SetUb(bound)
+            self.restored.append(key)
+
+    def satisfied(self, key):
+        """Whether the delays of the last feasible solve satisfy the rows of the key."""
+        return all(sum(coefficient * self.delays[j] for j, coefficient in coefficients) <= bound + 1e-9
+                   for _, coefficients, bound in self.rows.get(key, []))
+
+    def is_realizable(self):
+        if self.delays is not None and all(self.satisfied(key) for key in self.restored if self.removed[key] == 0):
+            self.restored = []
+            return True
+        self.solves += 1
+        if self.solver.Solve() != self.solver.OPTIMAL:
+            return False
+        self.delays = [x.solution_value() for x in self.x]
+        self.restored = []
+        return True
+
+
+class PathGraph:
+    """The constraints of a path as a difference constraint graph, with the same interface as PathLP. Every constraint
+    bounds a sum of consecutive delays x[s] + ... + x[e], i.e., the difference P[e+1] - P[s] of the prefix sums
+    P[j] = x[0] + ... + x[j-1], hence it is an edge s -> e+1 (or e+1 -> s if it is a lower bound) weighted by its
+    threshold, and x[j] >= 0 is an edge j+1 -> j of weight 0. The path is realizable iff the graph has no negative
+    cycle, which is decided by Bellman-Ford over NumPy arrays starting from the prefix sums of the last realizable
+    check. If the path is not realizable, conflict holds the constraints of a negative cycle."""
+
+    def __init__(self, ta, path, msr):
+        clocks = []
+        compute_clocks(path, ta, clocks)
+        clocks = sorted(clocks)
+        length_of_path = len(path) / 2
+        self.solves = 0
+        self.conflict = None
+
+        self.keys = dict()  # constraint name : (location, parsed constraint), see parametrize_msr
+        for name in msr:
+            c = ta.constraint_registry[name]
+            self.keys[name] = (c[1], ta.parse_inequality_simple(c[0]))
+        self.removed = dict()  # (location, parsed constraint) : number of removed constraints with the key
+        for key in self.keys.values():
+            self.removed[key] = self.removed.get(key, 0) + 1
+
+        self.constraints = [None]  # the (location, parsed constraint) pairs of the edges, None for x[j] >= 0
+        edges = [(j + 1, j, 0, 0) for j in range(length_of_path)]  # (source, target, weight, constraint)
+        for location, c, delays in path_constraints(path, clocks, ta):
+            a, b = compute_constraint({c[0]: delays}, c, -1)
+            self.constraints.append((location, c))
+            for k in range(len(a)):
+                if len(delays) == 0:  # 0 <= b, a negative self-loop if it does not hold
+                    edges.append((0, 0, b[k], len(self.constraints) - 1))
+                elif a[k][0][1] > 0:
+                    edges.append((delays[0], delays[-1] + 1, b[k], len(self.constraints) - 1))
+                else:
+                    edges.append((delays[-1] + 1, delays[0], b[k], len(self.constraints) - 1))
+        self.source = np.array([e[0] for e in edges], dtype=np.int64)
+        self.target = np.array([e[1] for e in edges], dtype=np.int64)
+        self.weight = np.array([e[2] for e in edges], dtype=np.int64)
+        self.constraint = np.array([e[3] for e in edges], dtype=np.int64)
+        self.enabled = np.array([self.removed.get(self.constraints[e[3]], 0) == 0 for e in edges], dtype=bool)
+        self.rows = dict()  # (location, parsed constraint) : list of the indices of its edges
+        for i in range(len(edges)):
+            if self.constraints[edges[i][3]] in self.removed:
+                self.rows.setdefault(self.constraints[edges[i][3]], []).append(i)
+        self.potential = np.zeros(length_of_path + 1, dtype=np.int64)  # the prefix sums of the last realizable check
+
+    def toggle(self, key, enabled):
+        self.enabled[self.rows.get(key, [])] = enabled
+
+    def remove(self, name):
+        """Removes the constraint from the path, it has to be in the relaxation set."""
+        key = self.keys[name]
+        self.removed[key] += 1
+        if self.removed[key] == 1:
+            self.toggle(key, False)
+
+    def restore(self, name):
+        """Restores a removed constraint."""
+        key = self.keys[name]
+        self.removed[key] -= 1
+        if self.removed[key] == 0:
+            self.toggle(key, True)
+
+    def is_realizable(self):
+        self.solves += 1
+        self.conflict = None
+        source, target, weight = self.source[self.enabled], self.target[self.enabled], self.weight[self.enabled]
+        edges = np.flatnonzero(self.enabled)
+        distance = self.potential.copy()
+        predecessor = np.full(len(distance), -1, dtype=np.int64)  # the edges that last decreased the distances
+        for _ in range(len(distance) + 1):
+            candidate = distance[source] + weight
+            relaxed = distance.copy()
+            np.minimum.at(relaxed, target, candidate)
+            decreased = relaxed < distance
+            if not decreased.any():
+                self.potential = distance
+                return True
+            improving = (candidate == relaxed[target]) & decreased[target]
+            predecessor[target[improving]] = edges[improving]
+            distance = relaxed
+        # a negative cycle: walk back from a vertex decreased in the last round into the cycle, then around it
+        v = int(np.flatnonzero(decreased)[0])
+        for _ in range(len(distance)):
+            v = int(self.source[predecessor[v]])
+        cycle, u = [], v
+        while True:
+            cycle.append(int(self.constraint[predecessor[u]]))
+            u = int(self.source[predecessor[u]])
+            if u == v:
+                break
+        self.conflict = [self.constraints[i] for i in sorted(set(cycle)) if i != 0]
+        return False
+
+
+def compute_constraint(clock_to_delay, c, parameter):
+    """The rows of the constraint c as sparse lists of (variable index, coefficient), and their bounds."""
     # c : clock_name, operator, threshold, equality
-    A_row = [[0 for _ in range(number_of_variables)]]  # initialize the row
-    for di in clock_to_delay[c[0]]:  # Clock to delay mapping for A
-        A_row[0][di] = 1
+    A_row = [[(di, 1) for di in clock_to_delay[c[0]]]]  # Clock to delay mapping for A
 
     B_row = [c[2]]
     if c[1] == '>':  # multiply by -1
-        A_row[0] = [x * -1 for x in A_row[0]]
+        A_row[0] = [(j, -a) for j, a in A_row[0]]
         B_row[0] = -1 * B_row[0]
 
     if parameter != -1:
-        A_row[0][parameter] = -1
+        A_row[0].append((parameter, -1))
 
     if c[1] == '=':  # >= && <= is equal to ==
-        A_row.append([x * -1 for x in A_row[0]])
+        A_row.append([(j, -a) for j, a in A_row[0]])
         B_row.append(-1 * B_row[0])
 
     return A_row, B_row
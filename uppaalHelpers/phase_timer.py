@@ -0,0 +1,68 @@
+"""Wall-clock timing of the phases of the reachability checks.
+
+time.clock() of Python 2 is the CPU time of the process, hence it does not include the time spent by verifyta.
+The phases are therefore measured by time.time(), and the CPU time of every verifyta process is taken from its
+resource usage (see ta_helper.run_verifyta)."""
+import json
+import time
+
+PHASES = ['relaxation', 'serialization', 'file_write', 'child_wall', 'child_cpu', 'trace_parsing', 'core_analysis',
+          'native_search']
+
+
+def percentile(samples, p):
+    """The p-th percentile (nearest rank) of the sorted samples."""
+    if not samples:
+        return 0.0
+    rank = int(round(p / 100.0 * len(samples) + 0.5)) - 1
+    return samples[min(max(rank, 0), len(samples) - 1)]
+
+
+class PhaseTimer:
+
+    def __init__(self):
+        # phase : [seconds]; list.append is atomic, hence the threads of OraclePool can add samples
+        self.samples = dict((phase, []) for phase in PHASES)
+
+    def record(self, times):
+        """Adds a sample of every phase of the dictionary times (phase : seconds)."""
+        for phase in times:
+            self.samples[phase].append(times[phase])
+
+    def since(self, phase, start):
+        """Adds the time elapsed since start (a time.time()) to the phase and returns the current time."""
+        now = time.time()
+        self.samples[phase].append(now - start)
+        return now
+
+    def summary(self):
+        """phase : {count, total, mean, p50, p90, p99, max} of the phases with at least one sample."""
+        result = dict()
+        for phase in PHASES:
+            samples = sorted(self.samples[phase])
+            if not samples:
+                continue
+            result[phase] = {
+                'count': len(samples),
+                'total': sum(samples),
+                'mean': sum(samples) / len(samples),
+                'p50': percentile(samples, 50),
+                'p90': percentile(samples, 90),
+                'p99': percentile(samples, 99),
+                'max': samples[-1],
+            }
+        return result
+
+    def print_summary(self):
+        summary = self.summary()
+        print "Phase            count      total       mean        p50        p90        p99        max"
+        for phase in PHASES:
+            if phase in summary:
+                s = summary[phase]
+                print "%-14s %7d %10.4f %10.4f %10.4f %10.4f %10.4f %10.4f" % (phase, s['count'], s['total'], s['mean'],
+                                                                             s['p50'], s['p90'], s['p99'], s['max'])
+
+    def dump_json(self, path, stats=None):
+        """Writes the summary of the phases, and the given statistics, as a JSON object."""
+        with open(path, 'w') as f:
+            json.dump({'phases': self.summary(), 'stats': stats or {}}, f, indent=2, sort_keys=True)
@@ -0,0 +1,55 @@
+"""A master model that answers several relaxation sets (seeds) with a single run of verifyta.
+
+The flags of the guards become arrays indexed by the seed, and an additional process, whose initial location is
+committed, nondeterministically picks the seed tamus_sel before any other process moves. For every seed i, verifyta
+gets the query E<> (target) && tamus_sel == i. The invariants cannot be flagged (see master_model), hence all the seeds
+of a model have to relax the same invariants."""
+import re
+
+import pyuppaal
+from master_model import MasterModel, DECLARATION_SLOT
+
+SELECTOR = 'TamusSelector'
+
+
+def selector_template():
+    choose = pyuppaal.Location(name='choose', id='tamus_choose', committed=True)
+    run = pyuppaal.Location(name='run', id='tamus_run')
+    select = pyuppaal.Transition(choose, run, select='i : int[0, TAMUS_SEEDS - 1]', assignment='tamus_sel = i')
+    return pyuppaal.Template(SELECTOR, locations=[choose, run], initlocation=choose, transitions=[select])
+
+
+class SelectorModel(MasterModel):
+    flag_format = '%s[tamus_sel]'
+
+    def __init__(self, nta, TA, query_file_path):
+        for template in nta.templates:
+            if template.initlocation.committed:
+                raise ValueError("The selector of seeds needs the initial locations not to be committed: "
+                                 + template.name)
+        if re.search(r'\b(tamus_sel|TAMUS_SEEDS|%s)\b' % SELECTOR, nta.declaration + nta.system):
+            raise ValueError("The model declares identifiers used by the selector of seeds.")
+        with open(query_file_path) as query_file:
+            queries = [q.strip() for q in query_file.read().split('\n') if q.strip() and not q.strip().startswith('//')]
+        if not queries or not queries[0].startswith('E<>'):
+            raise ValueError("The selector of seeds needs an E<> query.")
+        self.target = queries[0][len('E<>'):].strip()
+        MasterModel.__init__(self, nta, TA)
+
+    def network(self, nta, templates):
+        system = re.sub(r'^(\s*)system\s', r'\1system %s, ' % SELECTOR, nta.system, count=1, flags=re.MULTILINE)
+        return pyuppaal.NTA(DECLARATION_SLOT + "\n" + nta.declaration, system, templates + [selector_template()])
+
+    def invariant_key(self, relax_set):
+        """The seeds with the same key can be checked by a single model."""
+        return frozenset(self.relaxed_invariants(relax_set))
+
+    def render_batch(self, relax_sets):
+        """Returns the XML of the model and the queries for the seeds; the relax sets have the same invariant_key."""
+        relaxed_flags = [self.relaxed_flags(relax_set) for relax_set in relax_sets]
+        declaration = "const int TAMUS_SEEDS = %d;\nint tamus_sel;\n" % len(relax_sets)
+        declaration += "".join(["const bool %s[TAMUS_SEEDS] = {%s};\n" %
+                                (flag, ", ".join(['true' if flag in r else 'false' for r in relaxed_flags]))
+                                for flag in self.flag_names])
+        queries = "".join(["E<> (%s) && tamus_sel == %d\n" % (self.target, i) for i in range(len(relax_sets))])
+        return self.splice(declaration, self.relaxed_invariants(relax_sets[0])), queries
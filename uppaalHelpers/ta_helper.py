@@ -1,4 +1,10 @@
+import os
+import re
+import resource
+import signal
 import subprocess
+import threading
+import time
 import pyuppaal
 
 verification_result = {1: 'property is satisfied', 0: 'unknown', -1: 'property is not satisfied'}
@@ -17,6 +23,42 @@ def get_template_name(ta_file_path, model_name):
     return template_name
           
 
+class TraceIndex:
+    """Maps the process instances of a network to their templates, and the locations and transitions of the templates
+    to the ids of their registered constraints. Built once per run, it replaces the lookups of get_template_name in
+    the model file and the dictionaries of find_used_constraints."""
+
+    def __init__(self, nta, constraint_registry):
+        self.templates = dict()  # instance : template name
+        system = re.sub(r'//[^\n]*', ' ', re.sub(r'/\*.*?\*/', ' ', nta.system or "", flags=re.DOTALL))
+        for statement in system.split(';'):
+            statement = statement.strip()
+            match = re.match(r'([A-Za-z_]\w*)\s*=\s*([A-Za-z_]\w*)\s*\(', statement)
+            if match is not None:
+                self.templates[match.group(1)] = match.group(2)
+            elif re.match(r'system\s', statement):
+                for instance in re.split(r'[,<]', statement[len('system'):]):
+                    self.templates.setdefault(instance.strip(), instance.strip())
+        self.constraints = dict()  # (template, location) or (template, source, target, sync) : [constraint ids]
+        for cid in constraint_registry:
+            self.constraints.setdefault(constraint_registry[cid][1], []).append(cid)
+        self.constraint_registry = constraint_registry
+
+    def template_of(self, instance):
+        """The template of an instance; instances of parametrized templates are named <template>(<arguments>)."""
+        if instance not in self.templates and '(' in instance:
+            return self.templates.get(instance[:instance.index('(')].strip(), "")
+        return self.templates.get(instance, "")
+
+    def used_constraints(self, path, relaxation_set, used_constraints):
+        """The counterpart of find_used_constraints, relaxation_set should be a set."""
+        for element in path:
+            for constraint in self.constraints.get(element, []):
+                if constraint in relaxation_set:
+                    used_constraints[constraint] = self.constraint_registry[constraint]
+        return used_constraints
+
+
 def get_template(ta_file_path, query_file_name, template_name):
     """Reads the ta file and returns template(s)."""
     query_file = open(query_file_name)
@@ -41,14 +83,19 @@ def get_templates(ta_file_path):
     return nta, templates
 
 
-def set_templates_and_save(ta_file_path, nta, templates, ta_file_path_new=None):
-    """Set template as the first one and store the result."""
+def set_templates(nta, templates):
+    """Replace the templates of nta with the given templates of the same names."""
     template_dictionary = {template.name: template for template in templates}
 
     for index in range(len(nta.templates)):
         if template_dictionary.get(nta.templates[index].name) is not None:
             nta.templates[index] = template_dictionary[nta.templates[index].name]
 
+
+def set_templates_and_save(ta_file_path, nta, templates, ta_file_path_new=None):
+    """Set template as the first one and store the result."""
+    set_templates(nta, templates)
+
     xml_string = nta.to_xml()
     if not ta_file_path_new:
         ta_file_path_new = ta_file_path[0:-4] + "_new.xml"
@@ -59,7 +106,8 @@ def set_templates_and_save(ta_file_path, nta, templates, ta_file_path_new=None):
     return ta_file_path_new
 
 
-def verify_reachability(ta_file_path, query_file_path, TA, relaxation_set, template_name, print_result=False):
+def verify_reachability(ta_file_path, query_file_path, TA, relaxation_set, template_name, print_result=False,
+                        index=None, limits=None, timer=None):
     """
     It generates the query E<> model_name.final_location, and verifies TA against it.
 
@@ -68,6 +116,10 @@ def verify_reachability(ta_file_path, query_file_path, TA, relaxation_set, templ
     :param print_result: Boolean
     :param TA: TimedAutomata, we need the constraint registry
     :param relaxation_set: list containing constraints to be relaxed
+    :param index: TraceIndex of the model, the model file is searched for the templates of instances if not given
+    :param limits: a pair (wall-clock seconds, megabytes of memory) of limits of verifyta, None for no limit;
+                   the result is 0 (unknown) if verifyta exceeds a limit
+    :param timer: PhaseTimer that gets the times of verifyta and of the parsing of its trace
     :return res: 1,0,-1, see verification_result.
     :return used_constraints: dictionary containing constraints from relaxation set that are needed for the trace
     """
@@ -78,13 +130,15 @@ def verify_reachability(ta_file_path, query_file_path, TA, relaxation_set, templ
     trace = []
     res = 0
     used_constraints = {}
+    times = dict()
     try:
-        stdoutdata, traces = verifyWithTrace(ta_file_path, query_file_path, template_name)
+        stdoutdata, traces = verifyWithTrace(ta_file_path, query_file_path, template_name, index=index,
+                                             limits=limits, times=times)
         if 'is satisfied' in stdoutdata:
             res = 1
-            used_constraints = {}
-            for trace in traces:
-                used_constraints = find_used_constraints(trace, constraint_registry, relaxation_set, used_constraints)
+            start = time.time()
+            used_constraints, trace = used_constraints_of(traces, constraint_registry, relaxation_set, index)
+            times['trace_parsing'] = times.get('trace_parsing', 0.0) + time.time() - start
             if used_constraints == {}:
                 print "Something wrong happened with verifyta"
                 #  used_constraints = relaxation_set
@@ -94,6 +148,8 @@ def verify_reachability(ta_file_path, query_file_path, TA, relaxation_set, templ
     except Exception as e:
         print (e)
         pass
+    if timer is not None:
+        timer.record(times)
     #  qf.deleteTempFile(qfh)
     if print_result:
         print ("Checking " + ta_file_path + " against query " + query_file_path)
@@ -101,61 +157,158 @@ def verify_reachability(ta_file_path, query_file_path, TA, relaxation_set, templ
     return res, used_constraints, trace
 
 
-def verifyWithTrace(modelfilename, queryfilename, template_name, verifyta='verifyta'):
+def used_constraints_of(traces, constraint_registry, relaxation_set, index=None):
+    """Returns the constraints from relaxation set that are needed for the traces, and the last trace."""
+    used_constraints = {}
+    trace = []
+    relaxed = set(relaxation_set)
+    for trace in traces:
+        if index is not None:
+            used_constraints = index.used_constraints(trace, relaxed, used_constraints)
+        else:
+            used_constraints = find_used_constraints(trace, constraint_registry, relaxation_set, used_constraints)
+    return used_constraints, trace
+
+
+def verify_reachability_batch(ta_file_path, query_file_path, TA, relaxation_sets, template_name, index=None,
+                              selector=None, limits=None, timer=None):
+    """
+    Verifies a model with one query per relaxation set, see selector_model, in a single run of verifyta.
+
+    :param selector: the instance that selects the relaxation set, its trace is ignored
+    :return: the list of (res, used_constraints, trace) triples of the queries, see verify_reachability
+    """
+    results = [(0, {}, []) for _ in relaxation_sets]
+    times = dict()
+    try:
+        formulas, traces = verifyWithTraces(ta_file_path, query_file_path, template_name, index=index,
+                                            ignored=[selector], limits=limits, times=times)
+        # the traces are shown for the satisfied queries, in the order of the queries
+        traces.reverse()
+        start = time.time()
+        for i in range(min(len(formulas), len(relaxation_sets))):
+            if formulas[i] == 1 and traces:
+                used_constraints, trace = used_constraints_of(traces.pop(), TA.constraint_registry,
+                                                              relaxation_sets[i], index)
+                results[i] = (1, used_constraints, trace)
+            elif formulas[i] == -1:
+                results[i] = (-1, {}, [])
+        times['trace_parsing'] = times.get('trace_parsing', 0.0) + time.time() - start
+    except Exception as e:
+        print (e)
+    if timer is not None:
+        timer.record(times)
+    return results
+
+
+def verifyWithTrace(modelfilename, queryfilename, template_name, verifyta='verifyta', index=None, limits=None,
+                    times=None):
+    """Returns the output of verifyta and the trace of the (first) query as a list of paths of the instances."""
+    stdoutdata, traces = run_verifyta(modelfilename, queryfilename, template_name, verifyta, index, limits=limits,
+                                      times=times)
+    return stdoutdata, (traces[0] if traces else [])
+
+
+def verifyWithTraces(modelfilename, queryfilename, template_name, verifyta='verifyta', index=None, ignored=(),
+                     limits=None, times=None):
+    """Returns the results of the queries (1, 0 or -1, see verification_result) and the traces of the satisfied ones.
+    The paths of the ignored instances are not included in the traces."""
+    stdoutdata, traces = run_verifyta(modelfilename, queryfilename, template_name, verifyta, index, ignored, limits,
+                                      times)
+    formulas = []
+    for line in stdoutdata.split('\n'):
+        if 'is NOT satisfied' in line:
+            formulas.append(-1)
+        elif 'is satisfied' in line:
+            formulas.append(1)
+        elif 'Formula' in line and 'satisfied' in line:
+            formulas.append(0)
+    return formulas, traces
+
+
+def limit_child(memlimit):
+    """Returns the preexec_fn of a verifyta process: the process gets its own process group, hence it can be killed
+    together with its children, and its address space is limited to memlimit megabytes (if not None)."""
+    def preexec():
+        os.setsid()
+        if memlimit is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (memlimit << 20, memlimit << 20))
+    return preexec
+
+
+def kill_group(proc, expired):
+    expired.append(True)
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def run_verifyta(modelfilename, queryfilename, template_name, verifyta='verifyta', index=None, ignored=(),
+                 limits=None, times=None):
     #  modified version of verify from pyuppaal, change parameter verifyta to where verifyta is
+    #  if the dictionary times is given, it gets the wall-clock and CPU time of the verifyta process and the time of
+    #  the parsing of its output, see phase_timer; the output is parsed while verifyta runs, hence the wall-clock time
+    #  includes the parsing
     cmdline = ''
 
     cmdline += verifyta + ' -t1 ' + ' -o0' + ' -S1' + ' -q ' + modelfilename + ' ' + queryfilename
 
+    timelimit, memlimit = limits if limits is not None else (None, None)
     # print 'Executing', cmdline
+    started = time.time()
     proc = subprocess.Popen(
         cmdline,
-        stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-
-    (stdoutdata, stderrdata) = proc.communicate()
-    errlines = stderrdata.split('\n')
-
-    # Construct the trace
-    trace = {}
-    i = 0
-    template_names = {}  # template_instance_name : template_name
-    while i < len(errlines):
-        line = errlines[i]
-        if line.find('Transition') != -1:
-            i += 1
-            transition_line = errlines[i]
-            while transition_line.find('State') == -1:
-
-                start_of_state_1 = transition_line.find('.')+1
-                t_instance_name = transition_line[:start_of_state_1 - 1].strip()
-                if t_instance_name == '':
-                    i += 1
-                    transition_line = errlines[i]
-                    continue
-
-                end_of_state_1 = transition_line.find('-')
-                state_1 = transition_line[start_of_state_1:end_of_state_1]
-
-                start_of_state_2 = 1 + transition_line.find('.', end_of_state_1)
-                end_of_state_2 = transition_line.find(' ', end_of_state_1)
-                state_2 = transition_line[start_of_state_2:end_of_state_2]
-
-                start_of_identifiers = transition_line.find('{') + 1
-                end_of_identifiers = transition_line.find('}')
-
-                identifiers = transition_line[start_of_identifiers:end_of_identifiers]
-                sync_start = identifiers.find(',')
-                sync_end = identifiers.find(',', sync_start+1)
-                sync = identifiers[sync_start + 2: sync_end]
-                if sync == 'tau':
-                    sync = ''
-
-                if template_names.get(t_instance_name) is not None:
-                    instance_template_name = template_names[t_instance_name]
-                else:
-                    instance_template_name = get_template_name(modelfilename, t_instance_name)
-                    template_names[t_instance_name] = instance_template_name
-
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True,
+        preexec_fn=limit_child(memlimit) if limits is not None else None)
+    # once the wall-clock limit expires, the whole process group is killed; the output is then incomplete
+    expired = []
+    kill_timer = None
+    if timelimit is not None:
+        kill_timer = threading.Timer(timelimit, kill_group, [proc, expired])
+        kill_timer.daemon = True
+        kill_timer.start()
+
+    if index is None:
+        template_names = {}  # template_instance_name : template_name
+
+        def template_of(instance):
+            if template_names.get(instance) is None:
+                template_names[instance] = get_template_name(modelfilename, instance)
+            return template_names[instance]
+    else:
+        template_of = index.template_of
+
+    # stdout is drained concurrently, otherwise verifyta blocks once it fills the pipe while stderr is read
+    stdout_chunks = []
+    stdout_reader = threading.Thread(target=lambda: stdout_chunks.append(proc.stdout.read()))
+    stdout_reader.daemon = True
+    stdout_reader.start()
+
+    # Construct the traces in a single pass over the lines of the output; every trace starts with a 'Showing' line,
+    # and its transitions are listed after a 'Transition' line up to the next 'State' line
+    traces = []
+    trace = None
+    in_transition = False
+    parsing = 0.0
+    for line in proc.stderr:
+        if times is not None:
+            line_start = time.time()
+        if line.find('Showing') != -1:
+            trace = {}
+            traces.append(trace)
+        if not in_transition:
+            in_transition = line.find('Transition') != -1
+        elif line.find('State') != -1:
+            in_transition = False
+        else:
+            transition = parse_transition(line)
+            if transition is not None and transition[0] not in ignored:
+                t_instance_name, state_1, state_2, sync = transition
+                if trace is None:
+                    trace = {}
+                    traces.append(trace)
+                instance_template_name = template_of(t_instance_name)
                 if t_instance_name in trace:
                     trace[t_instance_name].append((instance_template_name, state_1, state_2, sync))
                     trace[t_instance_name].append((instance_template_name, state_2))
@@ -163,22 +316,60 @@ def verifyWithTrace(modelfilename, queryfilename, template_name, verifyta='verif
                     trace[t_instance_name] = [(instance_template_name, state_1),
                                               (instance_template_name, state_1, state_2, sync),
                                               (instance_template_name, state_2)]
-                i += 1
-                transition_line = errlines[i]
-        i += 1
-
+        if times is not None:
+            parsing += time.time() - line_start
+    stdout_reader.join()
+    stdoutdata = stdout_chunks[0] if stdout_chunks else ""
+    # wait4 gives the resource usage of this very child (and its waited-for children, e.g., verifyta under the shell),
+    # unlike getrusage(RUSAGE_CHILDREN), which sums all the children of the concurrent checks
+    _, status, usage = os.wait4(proc.pid, 0)
+    # the exit code as subprocess reports it: negative if a signal killed the process
+    proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    if kill_timer is not None:
+        kill_timer.cancel()
+        kill_timer.join()
+    if times is not None:
+        times['child_wall'] = time.time() - started
+        times['child_cpu'] = usage.ru_utime + usage.ru_stime
+    if expired:
+        return "", []
+
+    start = time.time()
     result_traces = []
-    if template_name != "All":
-        for key in trace:
-            instance_template_name = get_template_name(modelfilename, key)
-            if instance_template_name == template_name:
-                result_traces.append(trace[key])
-    else:
-        for key in trace:
-            result_traces.append(trace[key])
+    for trace in traces:
+        result_traces.append([trace[key] for key in trace
+                              if template_name == "All" or template_of(key) == template_name])
+    if times is not None:
+        times['trace_parsing'] = parsing + time.time() - start
     return stdoutdata, result_traces
 
 
+def parse_transition(transition_line):
+    """Parses a line of a transition in a trace of verifyta, i.e., the instance, the source and target locations, and
+    the synchronisation; returns None for a line without an instance."""
+    start_of_state_1 = transition_line.find('.')+1
+    t_instance_name = transition_line[:start_of_state_1 - 1].strip()
+    if t_instance_name == '':
+        return None
+
+    end_of_state_1 = transition_line.find('-')
+    state_1 = transition_line[start_of_state_1:end_of_state_1]
+    start_of_state_2 = 1 + transition_line.find('.', end_of_state_1)
+    end_of_state_2 = transition_line.find(' ', end_of_state_1)
+    state_2 = transition_line[start_of_state_2:end_of_state_2]
+
+    start_of_identifiers = transition_line.find('{') + 1
+    end_of_identifiers = transition_line.find('}')
+
+    identifiers = transition_line[start_of_identifiers:end_of_identifiers]
+    sync_start = identifiers.find(',')
+    sync_end = identifiers.find(',', sync_start+1)
+    sync = identifiers[sync_start + 2: sync_end]
+    if sync == 'tau':
+        sync = ''
+    return t_instance_name, state_1, state_2, sync
+
+
 def find_used_constraints(path, constraint_registry, relaxation_set, used_constraints):
 
     path_dictionary = dict()
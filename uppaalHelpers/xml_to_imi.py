@@ -1,5 +1,4 @@
 import ta_helper
-from ortools.linear_solver import pywraplp
 import argparse
 
 def parse_declaration(declaration_text):
@@ -347,6 +346,7 @@ def find_maximum_parameter_values(file_name, parameter_count, find_real_valued_d
 
 
 def solve_milp(zone, parameter_count, find_real_valued_delta, maximize, zero_parameters=[]):
+    from ortools.linear_solver import pywraplp  # imported here only, see path_analysis
     fixed_zone = fix_constraints_of_zone(zone, find_real_valued_delta)  # Our examples only have one but might extend it to multiple later
 
     solver = pywraplp.Solver('', pywraplp.Solver.CBC_MIXED_INTEGER_PROGRAMMING)  # create the solver